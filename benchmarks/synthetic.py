@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic cumulative DVH curves shaped like the Monaco exports used in the
+test suite: a zero dose point followed by doses at bin centres (5, 15, 25 ...
+cGy) and volumes in cc.
+"""
+
+import numpy as np
+
+
+def monaco_like_curve(n_points, kind="ptv", seed=0):
+    """Return (doses, cum_volumes) with n_points points.
+
+    kind="ptv" gives a steep shoulder at high dose like the PTV50 test
+    structure, kind="oar" a long tail from low dose like "prv cord".
+    """
+
+    rng = np.random.RandomState(seed)
+
+    bin_width = 7000./n_points
+    doses = np.empty(n_points)
+    doses[0] = 0
+    doses[1:] = (np.arange(n_points - 1) + 0.5)*bin_width
+
+    x = doses/doses[-1]
+    if kind == "ptv":
+        shape = 1./(1 + np.exp((x - 0.75)*40))
+        total = 500.
+    elif kind == "oar":
+        shape = np.exp(-x*6)*(1 - x)
+        total = 200.
+    else:
+        raise ValueError("kind must be one of ptv,oar not {0}".format(kind))
+
+    # monotone noise so curves in a cohort differ
+    jitter = np.cumsum(rng.rand(n_points))*1e-3/n_points
+    cum_volumes = np.maximum(total*shape - jitter, 0)
+    cum_volumes = np.minimum.accumulate(cum_volumes)
+    cum_volumes[-1] = 0
+
+    return doses, np.round(cum_volumes, 3)
+
+
+def monaco_like_differential(n_points, kind="ptv", seed=0):
+    """Return (doses, diff_volumes) for the same curves as monaco_like_curve"""
+
+    doses, cum_volumes = monaco_like_curve(n_points, kind, seed)
+    diff_volumes = np.append(cum_volumes[:-1] - cum_volumes[1:], cum_volumes[-1])
+    return doses, diff_volumes
+
+
+def cohort(n_structures, n_points=200, seed=0):
+    """Return a list of (doses, cum_volumes) curves alternating ptv & oar shapes"""
+
+    kinds = ("ptv", "oar")
+    return [
+        monaco_like_curve(n_points, kinds[i % 2], seed + i)
+        for i in range(n_structures)
+    ]
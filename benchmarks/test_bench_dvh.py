@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_bench_dvh
+----------------------------------
+
+Benchmarks for `dvh` module (requires pytest-benchmark). Run with
+`make bench` and compare against the last saved run with
+`make bench-compare`.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from dvh import DVH  # noqa
+from synthetic import cohort, monaco_like_curve, monaco_like_differential  # noqa
+
+
+SIZES = [50, 500, 5000, 100000]
+COHORT_SIZE = 10000
+
+FRACTIONS = np.array([0.02, 0.05, 0.5, 0.95, 0.98])
+DOSES = np.arange(500, 7000, 100.)
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: "%dpts" % n)
+def curve(request):
+    return monaco_like_curve(request.param)
+
+
+@pytest.fixture
+def dvh(curve):
+    return DVH(*curve)
+
+
+@pytest.fixture(scope="module")
+def cohort_curves():
+    return cohort(COHORT_SIZE)
+
+
+def test_init_cumulative(benchmark, curve):
+    benchmark(DVH, *curve)
+
+
+@pytest.mark.parametrize("n_points", SIZES, ids=lambda n: "%dpts" % n)
+def test_init_differential(benchmark, n_points):
+    doses, volumes = monaco_like_differential(n_points, "ptv")
+    benchmark(DVH, doses, volumes)
+
+
+def test_dose_to_volume_fraction_scalar(benchmark, dvh):
+    benchmark(dvh.dose_to_volume_fraction, 0.95)
+
+
+def test_dose_to_volume_fraction_array(benchmark, dvh):
+    benchmark(dvh.dose_to_volume_fraction, FRACTIONS)
+
+
+def test_volume_fraction_receiving_dose_scalar(benchmark, dvh):
+    benchmark(dvh.volume_fraction_receiving_dose, 2000.)
+
+
+def test_volume_fraction_receiving_dose_array(benchmark, dvh):
+    benchmark(dvh.volume_fraction_receiving_dose, DOSES)
+
+
+@pytest.fixture(scope="module")
+def tail_heavy_dvh():
+    # thousands of points share the lowest levels of the uniform bin volume lookup
+    return DVH.from_histogram(np.concatenate([np.ones(100), np.full(19900, 1E-9)]), 0.1)
+
+
+@pytest.mark.benchmark(group="tail heavy D query")
+def test_tail_heavy_dose_to_volume_fraction_uniform(benchmark, tail_heavy_dvh):
+    benchmark(tail_heavy_dvh._uniform_dose_to_volume_fraction, 1E-9)
+
+
+@pytest.mark.benchmark(group="tail heavy D query")
+def test_tail_heavy_dose_to_volume_fraction_general(benchmark, tail_heavy_dvh):
+    benchmark(tail_heavy_dvh._dose_to_volume_fraction, np.array(1E-9))
+
+
+@pytest.fixture(scope="module")
+def wrong_bin_width_dvh():
+    dvh = DVH.from_histogram(np.ones(1000000), 0.1)
+    dvh.bin_width = 100.
+    return dvh
+
+
+@pytest.mark.benchmark(group="wrong bin width V query")
+def test_wrong_bin_width_volume_fraction_receiving_dose_uniform(benchmark, wrong_bin_width_dvh):
+    benchmark(wrong_bin_width_dvh._uniform_volume_fraction_receiving_dose, 99999.95)
+
+
+@pytest.mark.benchmark(group="wrong bin width V query")
+def test_wrong_bin_width_volume_fraction_receiving_dose_general(benchmark, wrong_bin_width_dvh):
+    benchmark(wrong_bin_width_dvh._volume_fraction_receiving_dose, np.array(99999.95))
+
+
+def test_to_dict(benchmark, dvh):
+    benchmark(dvh.to_dict)
+
+
+def test_serialize_json(benchmark, dvh):
+    benchmark(dvh.serialize, "json")
+
+
+def test_cohort_init(benchmark, cohort_curves):
+    benchmark.pedantic(lambda: [DVH(d, v) for d, v in cohort_curves], rounds=3, iterations=1)
+
+
+def test_cohort_queries(benchmark, cohort_curves):
+    dvhs = [DVH(d, v) for d, v in cohort_curves]
+
+    def queries():
+        for dvh in dvhs:
+            dvh.dose_to_volume_fraction(FRACTIONS)
+            dvh.volume_fraction_receiving_dose(DOSES)
+
+    benchmark.pedantic(queries, rounds=3, iterations=1)
+
+
+def test_cohort_serialize_json(benchmark, cohort_curves):
+    dvhs = [DVH(d, v) for d, v in cohort_curves]
+    benchmark.pedantic(lambda: [dvh.serialize("json") for dvh in dvhs], rounds=3, iterations=1)
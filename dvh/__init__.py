@@ -5,4 +5,11 @@ __author__ = 'Randle Taylor'
 __email__ = 'randle.taylor@gmail.com'
 __version__ = '0.1.5'
 
-from .dvh import DVH, monotonic_increasing, monotonic_decreasing
+from .dvh import DVH, dvh_serializer, monotonic_increasing, monotonic_decreasing
+from .collection import DVHCollection
+from .archive import DVHArchive, DVHArchiveWriter, write_archive
+from .cache import MetricCache
+from .instrumentation import stats, reset
+from .instrumentation import enable as enable_instrumentation, disable as disable_instrumentation
+from .accumulator import DVHAccumulator
+from .summary import DVHSummary
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from .dvh import DVH
+
+
+class DVHAccumulator(object):
+    """Incrementally build a differential dose histogram from chunks of
+    voxel (or particle) doses.
+
+    Bin i covers doses in [i*bin_width, (i+1)*bin_width) like
+    masked_dose_histogram. The histogram grows to the highest dose seen so
+    memory use depends on the number of bins, never on the number of voxels.
+    """
+
+    def __init__(self, bin_width, n_bins=0):
+        if bin_width <= 0:
+            raise ValueError("bin_width must be positive")
+
+        self.bin_width = bin_width
+        self.volumes = np.zeros(n_bins, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.volumes)
+
+    @property
+    def total_volume(self):
+        return self.volumes.sum()
+
+    def _grow(self, n_bins):
+        if n_bins > len(self.volumes):
+            self.volumes = np.append(self.volumes, np.zeros(n_bins - len(self.volumes)))
+
+    def update(self, dose_values, voxel_volumes=1.):
+        """Add a chunk of dose values to the histogram. voxel_volumes is
+        either the volume of every voxel or an array with one volume per
+        dose value.
+        """
+
+        doses = np.asarray(dose_values, dtype=np.float64).ravel()
+        if not len(doses):
+            return self
+
+        bins = np.maximum(np.floor_divide(doses, self.bin_width), 0).astype(np.intp)
+
+        if np.ndim(voxel_volumes) == 0:
+            volumes = np.bincount(bins)*float(voxel_volumes)
+        else:
+            weights = np.asarray(voxel_volumes, dtype=np.float64).ravel()
+            if len(weights) != len(doses):
+                raise ValueError("Mismatch between length of voxel volumes and dose arrays")
+            volumes = np.bincount(bins, weights=weights)
+
+        self._grow(len(volumes))
+        self.volumes[:len(volumes)] += volumes
+
+        return self
+
+    def merge(self, other):
+        """Add the histogram of other (an accumulator with the same
+        bin_width) to this one.
+        """
+
+        if other.bin_width != self.bin_width:
+            raise ValueError("Can not merge accumulators with different bin widths")
+
+        self._grow(len(other.volumes))
+        self.volumes[:len(other.volumes)] += other.volumes
+
+        return self
+
+    def __add__(self, other):
+        merged = DVHAccumulator(self.bin_width)
+        return merged.merge(self).merge(other)
+
+    def to_dvh(self, max_at_zero_vol=False):
+        """Return a DVH snapshot of the histogram accumulated so far"""
+        return DVH.from_histogram(self.volumes, self.bin_width, max_at_zero_vol)
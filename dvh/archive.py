@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import struct
+import numpy as np
+
+from .dvh import DVH
+
+
+# An archive file is laid out as:
+#
+#   header   ARCHIVE_HEADER
+#   data     for each curve its doses, cum_volumes & diff_volumes as
+#            consecutive little endian float64 arrays
+#   records  one RECORD_DTYPE entry per curve (offset & length into the data
+#            region plus precomputed stats)
+#   keys     one KEY_DTYPE entry per curve with the hashes of its patient,
+#            plan & structure and the position of its name
+#   lookup   one LOOKUP_DTYPE entry per curve sorted by the hash of its
+#            (patient, plan, structure) key
+#   names    utf-8 json list of [patient, plan, structure] per curve
+#
+# Every region is opened with np.memmap so opening an archive only reads
+# the header and curves are paged in as they are used. A keyed lookup is a
+# binary search of the lookup region and only decodes the matching name.
+
+ARCHIVE_MAGIC = b"DVHA"
+ARCHIVE_VERSION = 2
+
+# magic, version, reserved, curve count, data length (in float64 values),
+# records offset, keys offset, lookup offset, names offset, names length
+# (in bytes)
+ARCHIVE_HEADER = struct.Struct("<4sHHQQQQQQQ")
+
+RECORD_DTYPE = np.dtype([
+    ("offset", "<i8"),
+    ("length", "<i8"),
+    ("min_dose", "<f8"),
+    ("mean_dose", "<f8"),
+    ("max_dose", "<f8"),
+    ("max_at_zero_vol", "<u8"),
+])
+
+# name_offset & name_length locate the json [patient, plan, structure] of a
+# curve within the names region
+KEY_DTYPE = np.dtype([
+    ("patient", "<u8"),
+    ("plan", "<u8"),
+    ("structure", "<u8"),
+    ("name_offset", "<u8"),
+    ("name_length", "<u8"),
+])
+
+LOOKUP_DTYPE = np.dtype([
+    ("hash", "<u8"),
+    ("index", "<u8"),
+])
+
+
+def _hash(value):
+    """Stable 64 bit hash of the json encoding of value"""
+
+    if not isinstance(value, bytes):
+        value = json.dumps(value).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+def _map(path, dtype, offset, count):
+    # np.memmap can not map zero length regions
+    if not count:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+class DVHArchiveWriter(object):
+    """Stream DVHs into an archive file that can be opened with DVHArchive.
+
+    Curves are written to disk as they are added so only the (small) index
+    is held in memory until close() is called.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(b"\0" * ARCHIVE_HEADER.size)
+        self._records = []
+        self._keys = []
+        self._names = []
+        self._names_length = 1
+        self._data_length = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, patient, plan, structure, dvh):
+        """Append dvh to the archive under the (patient, plan, structure) key"""
+
+        if self._file is None:
+            raise ValueError("Archive writer is closed")
+
+        n = len(dvh.doses)
+        for array in (dvh.doses, dvh.cum_volumes, dvh.diff_volumes):
+            self._file.write(np.asarray(array, dtype="<f8").tobytes())
+
+        self._records.append((
+            self._data_length, n, dvh.min_dose, dvh.mean_dose, dvh.max_dose, int(bool(dvh.max_at_zero_vol)),
+        ))
+
+        name = json.dumps([patient, plan, structure]).encode("utf-8")
+        self._keys.append((_hash(patient), _hash(plan), _hash(structure), self._names_length, len(name)))
+        self._names.append(name)
+        self._names_length += len(name) + 1
+        self._data_length += 3*n
+
+    def close(self):
+        """Write the index and header and close the archive file"""
+
+        if self._file is None:
+            return
+
+        records = np.array(self._records, dtype=RECORD_DTYPE)
+        keys = np.array(self._keys, dtype=KEY_DTYPE)
+
+        lookup = np.zeros(len(self._names), dtype=LOOKUP_DTYPE)
+        lookup["hash"] = [_hash(name) for name in self._names]
+        lookup["index"] = np.arange(len(lookup))
+        lookup.sort(order=["hash", "index"])
+
+        # the names of all curves joined into a single json list
+        names = b"[" + b",".join(self._names) + b"]"
+
+        records_offset = ARCHIVE_HEADER.size + 8*self._data_length
+        keys_offset = records_offset + records.nbytes
+        lookup_offset = keys_offset + keys.nbytes
+        names_offset = lookup_offset + lookup.nbytes
+
+        for region in (records, keys, lookup):
+            self._file.write(region.tobytes())
+        self._file.write(names)
+
+        self._file.seek(0)
+        self._file.write(ARCHIVE_HEADER.pack(
+            ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, len(records), self._data_length,
+            records_offset, keys_offset, lookup_offset, names_offset, len(names),
+        ))
+        self._file.close()
+        self._file = None
+
+
+def write_archive(path, items):
+    """Write an iterable of ((patient, plan, structure), dvh) pairs to path"""
+
+    with DVHArchiveWriter(path) as writer:
+        for (patient, plan, structure), dvh in items:
+            writer.add(patient, plan, structure, dvh)
+
+
+class DVHArchive(object):
+    """Read only, memory mapped access to a DVH archive file.
+
+    DVHs returned by the archive are backed by the mapped pages of the
+    file rather than copies so only the curves actually touched are read
+    from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            header = f.read(ARCHIVE_HEADER.size)
+
+        if len(header) < ARCHIVE_HEADER.size:
+            raise ValueError("{0} is not a DVH archive".format(path))
+
+        (magic, version, _, self._count, data_length, records_offset,
+            keys_offset, lookup_offset, names_offset, names_length) = ARCHIVE_HEADER.unpack(header)
+
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("{0} is not a DVH archive".format(path))
+
+        if version != ARCHIVE_VERSION:
+            raise ValueError("Unsupported DVH archive version {0}".format(version))
+
+        self._data = _map(path, "<f8", ARCHIVE_HEADER.size, data_length)
+        self.records = _map(path, RECORD_DTYPE, records_offset, self._count)
+        self._key_table = _map(path, KEY_DTYPE, keys_offset, self._count)
+        self._lookup = _map(path, LOOKUP_DTYPE, lookup_offset, self._count)
+        self._names = _map(path, np.uint8, names_offset, names_length)
+
+        self._keys = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the memory maps held by this archive"""
+        self._data = None
+        self.records = None
+        self._key_table = None
+        self._lookup = None
+        self._names = None
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._position(*key) is not None
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.get(*key)
+        return self._load(key)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self._load(idx)
+
+    def keys(self):
+        """Return a list of (patient, plan, structure) tuples in archive
+        order. This decodes the names of every curve so prefer get, find &
+        query on large archives.
+        """
+
+        if self._keys is None:
+            names = json.loads(self._names.tobytes().decode("utf-8")) if self._count else []
+            self._keys = [tuple(n) for n in names]
+
+        return self._keys
+
+    def key(self, idx):
+        """Return the (patient, plan, structure) key of the curve at idx"""
+        return self._decode_keys([idx])[0]
+
+    def _decode_keys(self, positions):
+        """Return the keys of the curves at positions, decoding only the
+        span of the names region they cover.
+        """
+
+        entries = self._key_table[positions]
+        starts = entries["name_offset"].astype(np.int64)
+        ends = starts + entries["name_length"].astype(np.int64)
+
+        first = int(starts.min())
+        span = self._names[first:int(ends.max())].tobytes()
+        names = b",".join(span[s:e] for s, e in zip((starts - first).tolist(), (ends - first).tolist()))
+        return [tuple(n) for n in json.loads(b"[" + names + b"]")]
+
+    def _position(self, patient, plan, structure):
+        """Return the position of (patient, plan, structure) or None"""
+
+        key = (patient, plan, structure)
+        hashes = self._lookup["hash"]
+        target = np.uint64(_hash(list(key)))
+
+        # equal hashes are adjacent; compare names to rule out collisions
+        idx = int(np.searchsorted(hashes, target, side="left"))
+        while idx < len(hashes) and hashes[idx] == target:
+            position = int(self._lookup["index"][idx])
+            if self.key(position) == key:
+                return position
+            idx += 1
+
+        return None
+
+    @property
+    def min_dose(self):
+        return self.records["min_dose"]
+
+    @property
+    def mean_dose(self):
+        return self.records["mean_dose"]
+
+    @property
+    def max_dose(self):
+        return self.records["max_dose"]
+
+    def get(self, patient, plan, structure):
+        """Return the DVH stored under (patient, plan, structure)"""
+
+        idx = self._position(patient, plan, structure)
+        if idx is None:
+            raise KeyError("No DVH for patient={0} plan={1} structure={2}".format(patient, plan, structure))
+
+        return self._load(idx)
+
+    def find(self, patient=None, plan=None, structure=None):
+        """Return the positions of all curves matching the given key parts
+        (None matches anything). Candidates are selected by comparing the
+        hashed key parts in bulk and only their names are decoded.
+        """
+
+        query = (patient, plan, structure)
+        matches = np.ones(self._count, dtype=bool)
+        for field, value in zip(("patient", "plan", "structure"), query):
+            if value is not None:
+                matches &= self._key_table[field] == np.uint64(_hash(value))
+
+        positions = np.flatnonzero(matches)
+        if not len(positions):
+            return []
+
+        return [
+            idx for idx, key in zip(positions.tolist(), self._decode_keys(positions))
+            if all(q is None or q == k for q, k in zip(query, key))
+        ]
+
+    def query(self, patient=None, plan=None, structure=None):
+        """Yield ((patient, plan, structure), dvh) for all matching curves"""
+
+        positions = self.find(patient, plan, structure)
+        for idx, key in zip(positions, self._decode_keys(positions) if positions else []):
+            yield key, self._load(idx)
+
+    def _load(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("DVHArchive index out of range")
+
+        record = self.records[idx]
+        offset, n = int(record["offset"]), int(record["length"])
+
+        doses = self._data[offset:offset + n]
+        cum_volumes = self._data[offset + n:offset + 2*n]
+        diff_volumes = self._data[offset + 2*n:offset + 3*n]
+
+        return DVH._from_arrays(
+            doses, cum_volumes, diff_volumes,
+            stats=(float(record["min_dose"]), float(record["max_dose"]), float(record["mean_dose"])),
+            max_at_zero_vol=bool(record["max_at_zero_vol"]),
+        )
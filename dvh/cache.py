@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+
+class MetricCache(object):
+    """A bounded least recently used cache of DVH query results.
+
+    A single cache may be shared by many DVHs (see DVH.enable_cache) since
+    every entry is keyed by the DVH it belongs to as well as the query type
+    and argument.
+    """
+
+    def __init__(self, maxsize=128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, compute):
+        """Return the cached value for key, calling compute() to calculate
+        (and cache) it on a miss.
+        """
+
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            if len(self._data) >= self.maxsize:
+                self._data.popitem(last=False)
+        else:
+            self.hits += 1
+
+        self._data[key] = value
+        return value
+
+    def clear(self):
+        """Remove all entries and reset the hit & miss counters"""
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
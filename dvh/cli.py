@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line tool extracting DVH metrics from a directory of files, e.g.
+
+    dvh-metrics exports/ --metrics D95%,V20Gy,mean --format jsonl -o metrics.jsonl
+
+Text exports (see dvh.parsers) yield one row per structure, .json files
+(DVH.serialize("json")) and .dvhb files (DVH.serialize("binary")) one row
+per file. Files are spread over a process pool in chunks and rows are
+written as soon as each window of files completes, so memory use does not
+grow with the number of files.
+"""
+
+from __future__ import print_function
+
+import argparse
+import csv
+import fnmatch
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from . import parsers
+from .compare import metric_values
+from .constraints import Metric
+from .dvh import DVH
+
+
+JSON_EXTENSIONS = (".json",)
+BINARY_EXTENSIONS = (".dvhb", ".bin")
+
+
+def iter_paths(directory, pattern="*"):
+    """Yield the paths of files in directory matching pattern without
+    listing the whole directory up front.
+    """
+
+    for entry in os.scandir(directory):
+        if fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+            yield entry.path
+
+
+def load_dvhs(path, fmt="auto", max_at_zero_vol=False):
+    """Return a list of (structure name, DVH) read from path"""
+
+    stem, ext = os.path.splitext(os.path.basename(path))
+    ext = ext.lower()
+
+    if ext in JSON_EXTENSIONS:
+        with open(path) as f:
+            return [(stem, DVH.from_json(f.read(), max_at_zero_vol=max_at_zero_vol))]
+    elif ext in BINARY_EXTENSIONS:
+        with open(path, "rb") as f:
+            return [(stem, DVH.from_bytes(f.read()))]
+
+    return list(parsers.iter_file(path, fmt, max_at_zero_vol))
+
+
+def file_metrics(path, metrics, fmt="auto", max_at_zero_vol=False):
+    """Return (path, rows, error) where rows is a list of (structure,
+    metric values) for every structure in the file at path. Errors are
+    returned rather than raised so one bad file does not stop a batch.
+    """
+
+    try:
+        dvhs = load_dvhs(path, fmt, max_at_zero_vol)
+        if not dvhs:
+            return path, [], None
+        values = metric_values([dvh for _, dvh in dvhs], metrics)
+        return path, [(name, row.tolist()) for (name, _), row in zip(dvhs, values)], None
+    except Exception as e:
+        return path, [], "{0}: {1}".format(type(e).__name__, e)
+
+
+def iter_results(paths, metrics, fmt="auto", max_at_zero_vol=False, workers=None, chunksize=8):
+    """Yield file_metrics results for paths, in order, computed by a pool of
+    workers processes (in process when workers is 1). paths are consumed a
+    window at a time so only a bounded number of files is in flight.
+    """
+
+    func = functools.partial(file_metrics, metrics=metrics, fmt=fmt, max_at_zero_vol=max_at_zero_vol)
+    paths = iter(paths)
+
+    if workers == 1:
+        for path in paths:
+            yield func(path)
+        return
+
+    workers = workers or multiprocessing.cpu_count()
+    window = chunksize*workers*4
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        while True:
+            batch = list(itertools.islice(paths, window))
+            if not batch:
+                break
+            for result in pool.imap(func, batch, chunksize):
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class CSVWriter(object):
+
+    def __init__(self, stream, metric_names):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(["file", "structure"] + metric_names)
+
+    def write(self, path, structure, values):
+        self.writer.writerow([path, structure] + values)
+
+
+class JSONLWriter(object):
+
+    def __init__(self, stream, metric_names):
+        self.stream = stream
+        self.metric_names = metric_names
+
+    def write(self, path, structure, values):
+        row = {"file": path, "structure": structure, "metrics": dict(zip(self.metric_names, values))}
+        self.stream.write(json.dumps(row) + "\n")
+
+
+WRITERS = {
+    "csv": CSVWriter,
+    "jsonl": JSONLWriter,
+}
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(prog="dvh-metrics", description="Extract DVH metrics from a directory of DVH files")
+    parser.add_argument("directory", help="directory of DVH export, .json or .dvhb files")
+    parser.add_argument("-m", "--metrics", required=True, help="comma separated metrics e.g. D95%%,V20Gy,mean")
+    parser.add_argument("-p", "--pattern", default="*", help="file name pattern (default: *)")
+    parser.add_argument("-f", "--format", default="csv", choices=sorted(WRITERS), help="output format (default: csv)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--export-format", default="auto", choices=("auto",) + parsers.FORMATS, help="text export format")
+    parser.add_argument("--dose-units", default="cGy", help="units of the DVH doses (default: cGy)")
+    parser.add_argument("--max-at-zero-vol", action="store_true", help="use the first zero volume dose as max dose")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: cpu count)")
+    parser.add_argument("--chunksize", type=int, default=8, help="files per task sent to a worker (default: 8)")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    metric_names = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    try:
+        metrics = [Metric.parse(m, args.dose_units) for m in metric_names]
+    except ValueError as e:
+        print("dvh-metrics: {0}".format(e), file=sys.stderr)
+        return 2
+
+    if not os.path.isdir(args.directory):
+        print("dvh-metrics: {0} is not a directory".format(args.directory), file=sys.stderr)
+        return 2
+
+    stream = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = WRITERS[args.format](stream, metric_names)
+
+    start = time.time()
+    n_files = n_structures = n_errors = 0
+
+    try:
+        results = iter_results(
+            iter_paths(args.directory, args.pattern), metrics, args.export_format,
+            args.max_at_zero_vol, args.workers, args.chunksize,
+        )
+        for path, rows, error in results:
+            n_files += 1
+            if error:
+                n_errors += 1
+                print("dvh-metrics: skipped {0} ({1})".format(path, error), file=sys.stderr)
+            for structure, values in rows:
+                writer.write(path, structure, values)
+            n_structures += len(rows)
+    finally:
+        if args.output:
+            stream.close()
+
+    elapsed = max(time.time() - start, 1E-9)
+    print(
+        "Processed {0} files ({1} structures, {2} errors) in {3:.2f}s: {4:.1f} files/s, {5:.1f} structures/s".format(
+            n_files, n_structures, n_errors, elapsed, n_files/elapsed, n_structures/elapsed,
+        ),
+        file=sys.stderr,
+    )
+
+    return 1 if n_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from .dvh import DVH
+
+
+# upper bound on the number of elements in the temporary arrays the blocked
+# operations on collections (e.g. in compare & radiobiology) hold at once
+BLOCK_ELEMENTS = 2**22
+
+
+def _segmented_search(values, starts, ends, queries, descending=False):
+    """Vectorized binary search over many sorted segments of values at once.
+
+    For each (start, end, query) triple return the index one past the last
+    element of values[start:end] that is <= query (or >= query when the
+    segments are descending), i.e. np.searchsorted(..., side="right") + start
+    for ascending segments. starts, ends and queries are broadcast together.
+    """
+
+    starts, ends, queries = np.broadcast_arrays(starts, ends, queries)
+    lo = np.array(starts, dtype=np.intp)
+    hi = np.array(ends, dtype=np.intp)
+    last = len(values) - 1
+
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        vals = values[np.minimum(mid, last)]
+        if descending:
+            right = vals >= queries
+        else:
+            right = vals <= queries
+        lo = np.where(active & right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+        active = lo < hi
+
+    return lo
+
+
+def as_collection(dvhs):
+    """Return dvhs (a DVHCollection, a single DVH or an iterable of DVHs)
+    as a DVHCollection.
+    """
+
+    if isinstance(dvhs, DVHCollection):
+        return dvhs
+    elif isinstance(dvhs, DVH):
+        return DVHCollection.from_dvhs([dvhs])
+    return DVHCollection.from_dvhs(dvhs)
+
+
+class DVHCollection(object):
+    """A packed container for many cumulative dose volume histograms.
+
+    The doses and cumulative volumes of every member are stored end to end in
+    two contiguous arrays and member i occupies doses[offsets[i]:offsets[i+1]]
+    (a CSR like layout). Stats and dose/volume queries are evaluated for all
+    members at once without looping over DVH objects.
+    """
+
+    def __init__(self, doses, cum_volumes, offsets, max_at_zero_vol=False):
+        """
+        doses and cum_volumes are the concatenated (zero padded and
+        normalized) doses and cum_volumes of each member as held by DVH
+        objects and offsets is an array of len(members) + 1 boundaries.
+        """
+
+        self.doses = np.asarray(doses, dtype=np.float64)
+        self.cum_volumes = np.asarray(cum_volumes, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+
+        if len(self.doses) != len(self.cum_volumes):
+            raise ValueError("Mismatch between length of volumes and dose arrays")
+
+        if len(self.offsets) < 1 or self.offsets[0] != 0 or self.offsets[-1] != len(self.doses):
+            raise ValueError("offsets must start at 0 and end at the total number of points")
+
+        if np.any(np.diff(self.offsets) < 3):
+            raise ValueError("Each DVH in a collection must contain at least 3 points")
+
+        self.max_at_zero_vol = np.zeros(len(self), dtype=bool) | np.asarray(max_at_zero_vol, dtype=bool)
+
+        self._set_volumes()
+        self._calculate_stats()
+
+    @classmethod
+    def from_dvhs(cls, dvhs):
+        """Pack an iterable of existing DVH instances into a collection.
+
+        Dose stats the members already hold (e.g. read from a serialized
+        DVH or carried over by simplify) are kept, the rest are calculated
+        from the packed curves.
+        """
+
+        dvhs = list(dvhs)
+        lengths = [len(d.doses) for d in dvhs]
+        offsets = np.zeros(len(dvhs) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=offsets[1:])
+
+        if dvhs:
+            doses = np.concatenate([d.doses for d in dvhs])
+            cum_volumes = np.concatenate([d.cum_volumes for d in dvhs])
+        else:
+            doses = cum_volumes = np.zeros(0)
+
+        collection = cls(doses, cum_volumes, offsets, [d.max_at_zero_vol for d in dvhs])
+
+        for stat in ("min_dose", "mean_dose", "max_dose"):
+            known = [(i, getattr(d, "_" + stat)) for i, d in enumerate(dvhs) if getattr(d, "_" + stat) is not None]
+            if known:
+                idx, values = zip(*known)
+                getattr(collection, stat)[list(idx)] = values
+
+        return collection
+
+    @classmethod
+    def from_arrays(cls, doses, volumes, max_at_zero_vol=False):
+        """Create a collection from sequences of raw dose and volume arrays
+        (cumulative or differential) as accepted by DVH.
+        """
+
+        if len(doses) != len(volumes):
+            raise ValueError("Mismatch between number of dose and volume arrays")
+
+        return cls.from_dvhs(DVH(d, v, max_at_zero_vol) for d, v in zip(doses, volumes))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("DVHCollection index out of range")
+
+        # members are views of the packed arrays rather than copies
+        s, e = self.offsets[idx], self.offsets[idx + 1]
+        return DVH.from_buffers(
+            self.doses[s:e], self.cum_volumes[s:e], self.diff_volumes[s:e],
+            stats=(float(self.min_dose[idx]), float(self.max_dose[idx]), float(self.mean_dose[idx])),
+            max_at_zero_vol=bool(self.max_at_zero_vol[idx]),
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def starts(self):
+        return self.offsets[:-1]
+
+    @property
+    def ends(self):
+        return self.offsets[1:]
+
+    def _set_volumes(self):
+
+        # per member cum[i] - cum[i+1] with the final point of each member
+        # keeping its own cumulative volume
+        self.diff_volumes = np.empty_like(self.cum_volumes)
+        self.diff_volumes[:-1] = self.cum_volumes[:-1] - self.cum_volumes[1:]
+        if len(self):
+            last = self.ends - 1
+            self.diff_volumes[last] = self.cum_volumes[last]
+
+    def _calculate_stats(self):
+
+        if not len(self):
+            self.mean_dose = self.min_dose = self.max_dose = np.zeros(0)
+            return
+
+        starts = self.starts
+        self.mean_dose = np.add.reduceat(self.doses * self.diff_volumes, starts)
+
+        idx = np.arange(len(self.doses))
+        nonzero = self.diff_volumes > 0
+        first_nonzero = np.minimum.reduceat(np.where(nonzero, idx, len(idx)), starts)
+        last_nonzero = np.maximum.reduceat(np.where(nonzero, idx, -1), starts)
+
+        # special case to handle Monaco min dose = 0
+        d1, d2 = self.doses[starts + 1], self.doses[starts + 2]
+        monaco_zero = d1 == (d2 - d1) // 2
+        self.min_dose = np.where(monaco_zero, 0., self.doses[np.minimum(first_nonzero, len(idx) - 1)])
+
+        max_idx = np.where(self.max_at_zero_vol, last_nonzero + 1, last_nonzero)
+        self.max_dose = self.doses[max_idx]
+
+    def dose_to_volume_fraction(self, volume_fraction):
+        """Return the dose that receives at least volume_fraction % dose for
+        every member of the collection.
+
+        The result has shape (len(collection),) + np.shape(volume_fraction)
+        and matches DVH.dose_to_volume_fraction for each member.
+        """
+
+        fractions = np.asarray(volume_fraction, dtype=np.float64)
+
+        invalid = (fractions < 0.) | (fractions > 1.)
+        if invalid.any():
+            raise ValueError("%.3G is outside expected volume fraction range of 0 <= v <= 1" % (fractions[invalid].flat[0]))
+
+        shape = (len(self),) + fractions.shape
+        q = fractions.reshape(1, -1)
+        starts, ends = self.starts[:, None], self.ends[:, None]
+
+        lower_idx = _segmented_search(self.cum_volumes, starts, ends, q, descending=True) - 1
+        lo = np.clip(lower_idx, starts, ends - 2)
+        hi = lo + 1
+
+        ds, vs = self.doses, self.cum_volumes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            doses = ds[lo] + (ds[hi] - ds[lo])*(q - vs[lo]) / (vs[hi] - vs[lo])
+
+        doses = np.where(q == 0, self.max_dose[:, None], doses)
+        doses = np.where(q == 1., self.min_dose[:, None], doses)
+
+        return doses.reshape(shape)
+
+    def volume_fraction_receiving_dose(self, dose):
+        """Return the fraction of total volume recieving at least the input
+        dose for every member of the collection.
+
+        The result has shape (len(collection),) + np.shape(dose) and matches
+        DVH.volume_fraction_receiving_dose for each member.
+        """
+
+        doses = np.asarray(dose, dtype=np.float64)
+
+        shape = (len(self),) + doses.shape
+        q = doses.reshape(1, -1)
+        starts, ends = self.starts[:, None], self.ends[:, None]
+
+        lower_idx = _segmented_search(self.doses, starts, ends, q) - 1
+        lo = np.clip(lower_idx, starts, ends - 2)
+        hi = lo + 1
+
+        ds, vs = self.doses, self.cum_volumes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volumes = vs[lo]+(vs[hi]-vs[lo])*(q-ds[lo])/(ds[hi]-ds[lo])
+
+        volumes = np.where(q <= self.min_dose[:, None], 1., volumes)
+        volumes = np.where(q > self.max_dose[:, None], 0., volumes)
+
+        return volumes.reshape(shape)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pairwise comparison of two sets of DVHs for the same structure.
+
+Both sets are resampled onto a common dose grid and compared in blocks of
+(reference, candidate) pairs so memory use is bounded by BLOCK_ELEMENTS and
+the resampled candidates rather than by the size of the output matrices.
+Pass np.memmap arrays as out to build matrices larger than memory.
+"""
+
+import numpy as np
+
+from .collection import BLOCK_ELEMENTS, DVHCollection, as_collection
+from .constraints import Metric, STATS
+from .population import resample
+
+
+def _trapezoid_weights(dose_grid):
+    """Return weights w such that values.dot(w) is the trapezoidal integral
+    of values over dose_grid.
+    """
+
+    steps = np.diff(dose_grid)
+    weights = np.zeros(len(dose_grid))
+    weights[:-1] += steps/2.
+    weights[1:] += steps/2.
+    return weights
+
+
+def _subcollection(collection, rows):
+    """Return the members rows (a slice) of collection as a new collection
+    sharing its packed arrays and keeping its dose stats.
+    """
+
+    offsets = collection.offsets[rows.start:rows.stop + 1]
+    points = slice(offsets[0], offsets[-1])
+    subcollection = DVHCollection(
+        collection.doses[points], collection.cum_volumes[points], offsets - offsets[0],
+        collection.max_at_zero_vol[rows],
+    )
+    for stat in ("min_dose", "mean_dose", "max_dose"):
+        setattr(subcollection, stat, getattr(collection, stat)[rows])
+    return subcollection
+
+
+def _resample_rows(collection, dose_grid):
+    """Return resample(collection, dose_grid) calculated a block of members
+    at a time so only the output matrix scales with the collection size.
+    """
+
+    out = np.empty((len(collection), len(dose_grid)))
+    step = max(1, BLOCK_ELEMENTS//max(len(dose_grid), 1))
+    for row in range(0, len(collection), step):
+        rows = slice(row, min(row + step, len(collection)))
+        out[rows] = resample(_subcollection(collection, rows), dose_grid)
+    return out
+
+
+def _block_sizes(n_rows, n_cols, n_doses):
+    cols = max(1, min(n_cols, BLOCK_ELEMENTS//max(n_doses, 1)))
+    rows = max(1, min(n_rows, BLOCK_ELEMENTS//(cols*max(n_doses, 1))))
+    return rows, cols
+
+
+def iter_distance_blocks(reference, candidates, dose_grid):
+    """Yield (rows, cols, area, max_volume_difference) for consecutive
+    blocks of the pairwise distance matrices where rows and cols are the
+    slices of reference and candidates the block covers.
+
+    area is the area between the cumulative curves (in dose units, with
+    volumes as fractions) and max_volume_difference the largest absolute
+    difference in volume fraction, both evaluated on dose_grid.
+    """
+
+    dose_grid = np.asarray(dose_grid, dtype=np.float64)
+    reference, candidates = as_collection(reference), as_collection(candidates)
+    weights = _trapezoid_weights(dose_grid)
+
+    candidate_volumes = _resample_rows(candidates, dose_grid)
+    n_rows, n_cols = len(reference), len(candidates)
+    row_step, col_step = _block_sizes(n_rows, n_cols, len(dose_grid))
+
+    for row in range(0, n_rows, row_step):
+        rows = slice(row, min(row + row_step, n_rows))
+        reference_volumes = resample(_subcollection(reference, rows), dose_grid)
+
+        for col in range(0, n_cols, col_step):
+            cols = slice(col, min(col + col_step, n_cols))
+            differences = np.abs(reference_volumes[:, None, :] - candidate_volumes[None, cols, :])
+            yield rows, cols, differences.dot(weights), differences.max(axis=-1)
+
+
+def distance_matrices(reference, candidates, dose_grid, out=None):
+    """Return (area, max_volume_difference) matrices of shape
+    (len(reference), len(candidates)) comparing every reference DVH with
+    every candidate DVH (see iter_distance_blocks). out is an optional pair
+    of arrays of that shape to fill, e.g. np.memmap's.
+    """
+
+    reference, candidates = as_collection(reference), as_collection(candidates)
+    n_rows, n_cols = len(reference), len(candidates)
+    if out is None:
+        out = (np.empty((n_rows, n_cols)), np.empty((n_rows, n_cols)))
+
+    area, max_difference = out
+    for rows, cols, area_block, max_block in iter_distance_blocks(reference, candidates, dose_grid):
+        area[rows, cols] = area_block
+        max_difference[rows, cols] = max_block
+
+    return area, max_difference
+
+
+def metric_values(dvhs, metrics, dose_units="cGy"):
+    """Return an array of shape (len(dvhs), len(metrics)) of the values of
+    metrics (Metric objects or strings like "D95%", "V20Gy" or "mean") for
+    every DVH, with one batched query per metric.
+    """
+
+    collection = as_collection(dvhs)
+    metrics = [m if isinstance(m, Metric) else Metric.parse(m, dose_units) for m in metrics]
+
+    values = np.empty((len(collection), len(metrics)))
+    for j, metric in enumerate(metrics):
+        if metric.query in STATS:
+            values[:, j] = getattr(collection, "%s_dose" % metric.query)
+        elif metric.query == "D":
+            values[:, j] = collection.dose_to_volume_fraction(metric.argument)
+        else:
+            values[:, j] = collection.volume_fraction_receiving_dose(metric.argument)
+
+    return values
+
+
+def metric_differences(reference, candidates, metrics, dose_units="cGy", out=None):
+    """Return an array of shape (len(metrics), len(reference),
+    len(candidates)) where out[k, i, j] is the value of metrics[k] for
+    reference[i] minus its value for candidates[j]. out is an optional
+    array of that shape to fill.
+    """
+
+    reference_values = metric_values(reference, metrics, dose_units)
+    candidate_values = metric_values(candidates, metrics, dose_units)
+
+    n_metrics, n_rows, n_cols = len(metrics), len(reference_values), len(candidate_values)
+    if out is None:
+        out = np.empty((n_metrics, n_rows, n_cols))
+
+    row_step = max(1, BLOCK_ELEMENTS//max(n_metrics*n_cols, 1))
+    for row in range(0, n_rows, row_step):
+        rows = slice(row, row + row_step)
+        out[:, rows, :] = reference_values[rows].T[:, :, None] - candidate_values.T[:, None, :]
+
+    return out
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from .collection import DVHCollection
+
+
+# dose unit -> size of unit in cGy
+DOSE_UNITS = {
+    "cgy": 1.,
+    "gy": 100.,
+}
+
+STATS = ("mean", "min", "max")
+
+COMPARISONS = ("<", "<=", ">", ">=")
+
+METRIC_RE = re.compile(
+    r"^\s*(?:(?P<query>[DV])\s*(?P<argument>\d+(?:\.\d*)?|\.\d+)\s*(?P<unit>%|c?gy)?|(?P<stat>mean|min|max))\s*$",
+    re.IGNORECASE,
+)
+
+CONSTRAINT_RE = re.compile(
+    r"^\s*(?P<metric>.+?)\s*(?P<comparison><=|>=|<|>)\s*(?P<threshold>\d+(?:\.\d*)?|\.\d+)\s*(?P<unit>%|c?gy)?\s*$",
+    re.IGNORECASE,
+)
+
+
+def _convert_dose(value, unit, dose_units):
+    """Convert value given in unit (cGy or Gy) to dose_units. Values without
+    a unit are assumed to already be in dose_units.
+    """
+
+    if not unit:
+        return value
+    try:
+        return value*DOSE_UNITS[unit.lower()]/DOSE_UNITS[dose_units.lower()]
+    except KeyError:
+        raise ValueError("Unknown dose unit {0}".format(unit))
+
+
+class Metric(object):
+    """A single DVH quantity: D (dose to a volume fraction), V (volume
+    fraction receiving a dose) or one of the mean, min & max dose stats.
+    """
+
+    def __init__(self, query, argument=None):
+        if query not in ("D", "V") + STATS:
+            raise ValueError("Unknown DVH metric {0}".format(query))
+
+        if query in ("D", "V") and argument is None:
+            raise ValueError("{0} metrics require an argument".format(query))
+
+        if query == "D" and not 0 <= argument <= 1:
+            raise ValueError("%.3G is outside expected volume fraction range of 0 <= v <= 1" % argument)
+
+        self.query = query
+        self.argument = argument
+
+    @classmethod
+    def parse(cls, text, dose_units="cGy"):
+        """Parse a metric like D95%, D2, V20Gy, V2000cGy, mean, min or max.
+
+        D arguments are volume percentages. V arguments are doses which are
+        converted from Gy or cGy to dose_units (the units of the DVH doses)
+        when a unit is given.
+        """
+
+        match = METRIC_RE.match(text)
+        if not match:
+            raise ValueError("Unable to parse DVH metric {0!r}".format(text))
+
+        if match.group("stat"):
+            return cls(match.group("stat").lower())
+
+        query, argument, unit = match.group("query").upper(), float(match.group("argument")), match.group("unit")
+        if query == "D":
+            if unit and unit != "%":
+                raise ValueError("D metrics take a volume percentage not {0}".format(unit))
+            return cls(query, argument/100.)
+
+        if unit == "%":
+            raise ValueError("V metrics take a dose not a percentage")
+        return cls(query, _convert_dose(argument, unit, dose_units))
+
+    def __str__(self):
+        """Metric text like D95%, V2000 (in the DVH dose units) or mean"""
+
+        if self.query in STATS:
+            return self.query
+        elif self.query == "D":
+            return "D{0:g}%".format(self.argument*100)
+        return "V{0:g}".format(self.argument)
+
+    def __repr__(self):
+        if self.query in STATS:
+            return "Metric({0!r})".format(self.query)
+        return "Metric({0!r}, {1!r})".format(self.query, self.argument)
+
+    def __eq__(self, other):
+        return isinstance(other, Metric) and (self.query, self.argument) == (other.query, other.argument)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.query, self.argument))
+
+
+class Constraint(object):
+    """A clinical constraint on a structure like "Cord max < 4500"."""
+
+    def __init__(self, structure, metric, comparison, threshold, name=None):
+        if comparison not in COMPARISONS:
+            raise ValueError("comparison must be one of {0} not {1}".format(','.join(COMPARISONS), comparison))
+
+        if metric.query == "V" and not 0 <= threshold <= 1:
+            raise ValueError("V thresholds are volume fractions in 0 <= v <= 1 (or percentages followed by %) not {0:g}".format(threshold))
+
+        self.structure = structure
+        self.metric = metric
+        self.comparison = comparison
+        self.threshold = float(threshold)
+        if name is None:
+            threshold = "{0:g}%".format(self.threshold*100) if metric.query == "V" else "{0:g}".format(self.threshold)
+            name = "{0} {1} {2} {3}".format(structure, metric, comparison, threshold)
+        self.name = name
+
+    @classmethod
+    def parse(cls, structure, text, dose_units="cGy"):
+        """Parse a constraint like "D95% >= 47.5Gy", "V20Gy < 30%" or
+        "mean < 2600" for structure.
+
+        Dose thresholds (for D and stat metrics) are converted to dose_units
+        when given in Gy or cGy. V thresholds are volume fractions or
+        percentages when followed by %.
+        """
+
+        match = CONSTRAINT_RE.match(text)
+        if not match:
+            raise ValueError("Unable to parse constraint {0!r}".format(text))
+
+        metric = Metric.parse(match.group("metric"), dose_units)
+        threshold, unit = float(match.group("threshold")), match.group("unit")
+
+        if metric.query == "V":
+            if unit and unit != "%":
+                raise ValueError("V constraints take a volume threshold not {0}".format(unit))
+            threshold = threshold/100. if unit else threshold
+        elif unit == "%":
+            raise ValueError("{0} constraints take a dose threshold".format(metric.query))
+        else:
+            threshold = _convert_dose(threshold, unit, dose_units)
+
+        return cls(structure, metric, match.group("comparison"), threshold, name="{0} {1}".format(structure, text.strip()))
+
+    def __repr__(self):
+        return "Constraint({0!r})".format(self.name)
+
+
+class ConstraintResults(object):
+    """Results of evaluating compiled constraints against a set of plans.
+
+    values, margin and passed are arrays of shape (len(plans),
+    len(constraints)). margin is positive when a constraint passes and
+    negative when it fails. Constraints on structures missing from a plan
+    have nan values and margins and do not pass.
+    """
+
+    def __init__(self, plans, constraints, values, margin, passed):
+        self.plans = plans
+        self.constraints = constraints
+        self.values = values
+        self.margin = margin
+        self.passed = passed
+
+    def rows(self):
+        """Yield one dictionary per (plan, constraint) pair"""
+
+        for i, plan in enumerate(self.plans):
+            for j, constraint in enumerate(self.constraints):
+                yield {
+                    "plan": plan,
+                    "structure": constraint.structure,
+                    "constraint": constraint.name,
+                    "value": self.values[i, j],
+                    "margin": self.margin[i, j],
+                    "passed": bool(self.passed[i, j]),
+                }
+
+    def failures(self):
+        """Yield the rows of all failed constraints"""
+        return (row for row in self.rows() if not row["passed"])
+
+
+class CompiledConstraints(object):
+    """A set of constraints grouped by structure and query type so they can
+    be evaluated against many plans with one batched query per structure.
+    """
+
+    def __init__(self, constraints):
+        self.constraints = list(constraints)
+
+        # structure -> (unique D fractions, unique V doses, stats) plus, per
+        # constraint, which column of the batched results holds its value
+        self._groups = OrderedDict()
+        self._columns = []
+
+        for constraint in self.constraints:
+            group = self._groups.setdefault(constraint.structure, {"D": [], "V": [], "stat": []})
+            metric = constraint.metric
+            key, argument = ("stat", metric.query) if metric.query in STATS else (metric.query, metric.argument)
+            if argument not in group[key]:
+                group[key].append(argument)
+            self._columns.append((key, group[key].index(argument)))
+
+        for group in self._groups.values():
+            group["D"] = np.array(group["D"], dtype=np.float64)
+            group["V"] = np.array(group["V"], dtype=np.float64)
+
+        self._upper = np.array([c.comparison.startswith("<") for c in self.constraints], dtype=bool)
+        self._strict = np.array([c.comparison in ("<", ">") for c in self.constraints], dtype=bool)
+        self._thresholds = np.array([c.threshold for c in self.constraints], dtype=np.float64)
+
+    def evaluate(self, plans):
+        """Evaluate the constraints against plans, a mapping of plan id to a
+        mapping of structure name -> DVH (or a sequence of such mappings).
+        Returns a ConstraintResults.
+        """
+
+        if not hasattr(plans, "keys"):
+            plans = OrderedDict(enumerate(plans))
+
+        plan_ids = list(plans)
+        values = np.full((len(plan_ids), len(self.constraints)), np.nan)
+
+        for structure, group in self._groups.items():
+            rows = [i for i, plan in enumerate(plan_ids) if structure in plans[plan]]
+            if not rows:
+                continue
+
+            collection = DVHCollection.from_dvhs(plans[plan_ids[i]][structure] for i in rows)
+            batched = {
+                "D": collection.dose_to_volume_fraction(group["D"]),
+                "V": collection.volume_fraction_receiving_dose(group["V"]),
+                "stat": np.array([getattr(collection, "%s_dose" % s) for s in group["stat"]]).reshape(-1, len(rows)).T,
+            }
+
+            for j, constraint in enumerate(self.constraints):
+                if constraint.structure == structure:
+                    key, column = self._columns[j]
+                    values[rows, j] = batched[key][:, column]
+
+        margin = np.where(self._upper, self._thresholds - values, values - self._thresholds)
+        with np.errstate(invalid="ignore"):
+            passed = np.where(self._strict, margin > 0, margin >= 0)
+
+        return ConstraintResults(plan_ids, self.constraints, values, margin, passed)
+
+
+def compile_constraints(constraints, dose_units="cGy"):
+    """Compile constraints for evaluation. constraints is an iterable of
+    Constraint objects or (structure, text) pairs like ("Cord", "max < 45Gy").
+    """
+
+    parsed = [
+        c if isinstance(c, Constraint) else Constraint.parse(c[0], c[1], dose_units)
+        for c in constraints
+    ]
+    return CompiledConstraints(parsed)
@@ -1,18 +1,58 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import itertools
 import json
+import math
+import struct
 import numpy as np
 
+from .cache import MetricCache
+from .instrumentation import instrumented
+
+
+# header for the binary serialization format:
+#   magic, version, itemsize of the stored arrays, flags, number of points,
+#   (4 pad bytes so the arrays stay 8 byte aligned), min, max & mean dose
+BINARY_MAGIC = b"DVHB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sBBHI4xddd")
+BINARY_WITH_DIFF = 1
+BINARY_MAX_AT_ZERO_VOL = 2
+
+
+def _input_size(dvh, doses=None, *args, **kwargs):
+    return len(doses) if doses is not None else 0
+
+
+def _curve_size(dvh, *args, **kwargs):
+    return len(dvh.doses)
+
+
+# unique keys identifying (a version of) a DVH in a shared MetricCache
+_cache_tokens = itertools.count()
+
+# query arguments answered by the scalar fast path of uniform bin DVHs
+_SCALAR_TYPES = (float, int, np.number)
+
+# relative tolerance on the dose spacing of uniform bin DVHs
+UNIFORM_BIN_RTOL = 1E-6
+
+# points stepped through one at a time by the uniform bin lookups before
+# they switch to a binary search
+_UNIFORM_MAX_STEPS = 8
+
 
 def monotonic_increasing(list_):
     """Check if input list is monotonically increasing"""
-    return np.all(np.diff(list_) >= 0)
+    a = np.asarray(list_)
+    return np.all(a[1:] >= a[:-1])
 
 
 def monotonic_decreasing(list_):
     """Check if input list is monotonically decreasing"""
-    return np.all(np.diff(list_) <= 0)
+    a = np.asarray(list_)
+    return np.all(a[1:] <= a[:-1])
 
 
 def differential_to_cumulative(doses, volumes):
@@ -20,18 +60,82 @@ def differential_to_cumulative(doses, volumes):
     return cum
 
 
+def dvh_serializer(func):
+    """Mark func as a DVH.serializers entry called as func(dvh, with_diff)
+    rather than with the to_dict() payload, e.g. for binary formats that
+    write the arrays directly.
+    """
+    func.takes_dvh = True
+    return func
+
+
+def masked_dose_histogram(dose, mask, bin_width, slab_size=16, label=None):
+    """Return the number of voxels of the dose grid selected by mask falling
+    in each dose bin, where bin i covers [i*bin_width, (i+1)*bin_width).
+    If label is given, mask is a label grid and voxels equal to label are
+    selected.
+
+    The grids are processed in slabs of slab_size along their first axis so
+    only the masked voxels of one slab are ever copied.
+    """
+
+    if np.shape(dose) != np.shape(mask) or np.ndim(dose) < 1:
+        raise ValueError("dose and mask must be arrays of the same shape")
+
+    if bin_width <= 0:
+        raise ValueError("bin_width must be positive")
+
+    counts = np.zeros(0, dtype=np.intp)
+
+    for start in range(0, len(dose), slab_size):
+        if label is None:
+            slab_mask = np.asarray(mask[start:start + slab_size], dtype=bool)
+        else:
+            slab_mask = np.asarray(mask[start:start + slab_size]) == label
+        values = np.asarray(dose[start:start + slab_size])[slab_mask]
+        if not len(values):
+            continue
+
+        bins = np.floor_divide(values.astype(np.float64), bin_width)
+        slab_counts = np.bincount(np.maximum(bins, 0).astype(np.intp))
+
+        if len(slab_counts) > len(counts):
+            counts = np.append(counts, np.zeros(len(slab_counts) - len(counts), dtype=np.intp))
+        counts[:len(slab_counts)] += slab_counts
+
+    return counts
+
+
 class DVH(object):
 
-    def __init__(self, doses=None, volumes=None, max_at_zero_vol=False):
+    # diff_volumes and the dose stats are derived lazily from doses &
+    # cum_volumes on first access and cached in the underscored slots
+    __slots__ = (
+        "max_at_zero_vol", "_doses", "_cum_volumes",
+        "_diff_volumes", "_mean_dose", "_min_dose", "_max_dose",
+        "_cache", "_cache_token", "_dose_quantum", "_bin_width", "_volume_table",
+    )
+
+    # serialize method name -> callable taking the to_dict() payload, or
+    # the DVH & with_diff for serializers marked with dvh_serializer
+    serializers = {
+        "json": json.dumps,
+        "binary": dvh_serializer(lambda dvh, with_diff: dvh._binary_serialize(with_diff, "<f8")),
+        "binary32": dvh_serializer(lambda dvh, with_diff: dvh._binary_serialize(with_diff, "<f4")),
+    }
+
+    @instrumented("DVH.__init__", _input_size)
+    def __init__(self, doses=None, volumes=None, max_at_zero_vol=False, dtype=np.float64):
         """
         doses, volumes are arrays of equal length representing points on a
         cumulative dose volume histogram curve.
+
+        dtype is the floating point type the arrays are stored as. Use
+        np.float32 to halve memory use, queries and stats are still
+        calculated in float64.
         """
         self.max_at_zero_vol = max_at_zero_vol
-
-        self.serializers = {
-            "json": self._json_serialize,
-        }
+        self._cache = None
 
         if doses is None or volumes is None:
             raise ValueError("You must pass both doses and volumes arrays")
@@ -45,93 +149,617 @@ class DVH(object):
         if len(volumes) != len(doses):
             raise ValueError("Mismatch between length of volumes and dose arrays")
 
-        self.doses = np.array(doses, dtype=np.float)
-        self._volumes = np.array(volumes, dtype=np.float)
+        if np.dtype(dtype).kind != "f":
+            raise ValueError("dtype must be a floating point type not {0}".format(np.dtype(dtype)))
+
+        # copy into buffers presized for the zero dose & zero volume padding
+        pad_start = int(doses[0] != 0)
+        pad_end = int(volumes[-1] != 0)
+        end = pad_start + len(doses)
+
+        self.doses = np.empty(end + pad_end, dtype=dtype)
+        cum_volumes = np.empty(end + pad_end, dtype=dtype)
+        self.doses[pad_start:end] = doses
+        cum_volumes[pad_start:end] = volumes
 
         # force dose to zero for first point
-        if self.doses[0] != 0:
-            self.doses = np.insert(self.doses, 0, 0)
-            self._volumes = np.insert(self._volumes, 0, self._volumes[0])
+        if pad_start:
+            self.doses[0] = 0
+            cum_volumes[0] = cum_volumes[1]
 
         # force volumes to zero for last point
-        if self._volumes[-1] != 0:
-            self.doses = np.append(self.doses, self.doses[-1] + (self.doses[-1] - self.doses[-2]))
-            self._volumes = np.append(self._volumes, 0)
+        if pad_end:
+            self.doses[-1] = self.doses[-2] + (self.doses[-2] - self.doses[-3])
+            cum_volumes[-1] = 0
+
+        self._set_volumes(cum_volumes)
+
+    @classmethod
+    def from_histogram(cls, volumes, bin_width, max_at_zero_vol=False, dtype=np.float64):
+        """Create a DVH from a differential histogram where volumes[i] is the
+        volume receiving a dose in [i*bin_width, (i+1)*bin_width). Each bin is
+        represented by its centre dose.
+        """
+
+        volumes = np.asarray(volumes, dtype=np.float64)
+        nonzero = np.nonzero(volumes)[0]
+        if not len(nonzero):
+            raise ValueError("Histogram does not contain any volume")
+
+        first, last = nonzero[0], nonzero[-1] + 1
+        doses = (np.arange(first, last) + 0.5)*bin_width
+        volumes = differential_to_cumulative(doses, volumes[first:last])
+
+        dvh = cls(doses, volumes, max_at_zero_vol, dtype)
+        dvh.bin_width = bin_width
+        return dvh
+
+    @classmethod
+    def from_dose_grid(cls, dose, mask, voxel_volume, bin_width, max_at_zero_vol=False, slab_size=16, dtype=np.float64):
+        """Create a DVH for the voxels of a 3D dose grid selected by mask (a
+        boolean array of the same shape). voxel_volume is the volume of a
+        single voxel and bin_width the dose bin width of the histogram.
+        """
+
+        counts = masked_dose_histogram(dose, mask, bin_width, slab_size)
+        return cls.from_histogram(counts*voxel_volume, bin_width, max_at_zero_vol, dtype)
+
+    @classmethod
+    def _from_arrays(cls, doses, cum_volumes, diff_volumes=None, stats=None, max_at_zero_vol=False):
+        """Create a DVH directly from zero padded, normalized cumulative
+        arrays without copying or validating them. stats is an optional
+        (min_dose, max_dose, mean_dose) tuple.
+        """
+
+        dvh = cls.__new__(cls)
+        dvh.max_at_zero_vol = max_at_zero_vol
+        dvh._cache = None
+
+        dvh.doses = doses
+        dvh.cum_volumes = cum_volumes
+        dvh._diff_volumes = diff_volumes
+
+        if stats is None:
+            dvh._min_dose = dvh._max_dose = dvh._mean_dose = None
+        else:
+            dvh._min_dose, dvh._max_dose, dvh._mean_dose = stats
+
+        return dvh
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a DVH from the output of dvh.serialize("binary") (or
+        "binary32"). The arrays are read only views of data created with
+        np.frombuffer so no copies are made.
+        """
+
+        if len(data) < BINARY_HEADER.size:
+            raise ValueError("Binary DVH data is truncated")
+
+        magic, version, itemsize, flags, npoints, min_dose, max_dose, mean_dose = BINARY_HEADER.unpack_from(data)
+
+        if magic != BINARY_MAGIC:
+            raise ValueError("Data is not a binary serialized DVH")
+
+        if version != BINARY_VERSION:
+            raise ValueError("Unsupported binary DVH version {0}".format(version))
+
+        if itemsize not in (4, 8):
+            raise ValueError("Unsupported binary DVH item size {0}".format(itemsize))
 
-        self._set_volumes()
-        self._calculate_stats()
+        with_diff = bool(flags & BINARY_WITH_DIFF)
+        narrays = 3 if with_diff else 2
+        if len(data) < BINARY_HEADER.size + narrays*npoints*itemsize:
+            raise ValueError("Binary DVH data is truncated")
 
-    def _set_volumes(self):
+        dtype = np.dtype("<f%d" % itemsize)
+        offsets = [BINARY_HEADER.size + i*npoints*itemsize for i in range(narrays)]
+        arrays = [np.frombuffer(data, dtype=dtype, count=npoints, offset=o) for o in offsets]
+        diff_volumes = arrays[2] if with_diff else None
 
-        self.cum_volumes = self._volumes/self._volumes.max()
-        self.diff_volumes = np.append(np.diff(self.cum_volumes[::-1])[::-1], self.cum_volumes[-1])
+        return cls._from_arrays(
+            arrays[0], arrays[1], diff_volumes,
+            stats=(min_dose, max_dose, mean_dose),
+            max_at_zero_vol=bool(flags & BINARY_MAX_AT_ZERO_VOL),
+        )
+
+    @classmethod
+    def from_dict(cls, data, validate=False, max_at_zero_vol=False):
+        """Create a DVH from the output of dvh.to_dict.
+
+        The stored arrays and stats are trusted as is rather than being
+        re-derived. Pass validate=True for a cheap check that data has the
+        expected keys and describes a padded, normalized cumulative DVH.
+        """
+
+        if validate:
+            missing = set(["doses", "cum_volumes", "min_dose", "max_dose", "mean_dose"]) - set(data)
+            if missing:
+                raise ValueError("DVH data is missing {0}".format(','.join(sorted(missing))))
+
+        stats = (data["min_dose"], data["max_dose"], data["mean_dose"])
+
+        return cls.from_buffers(
+            np.asarray(data["doses"], dtype=np.float64),
+            np.asarray(data["cum_volumes"], dtype=np.float64),
+            data.get("diff_volumes"), stats, validate, max_at_zero_vol,
+        )
+
+    @classmethod
+    def from_buffers(cls, doses, cum_volumes, diff_volumes=None, stats=None, validate=False, max_at_zero_vol=False):
+        """Create a DVH wrapping existing zero padded, normalized cumulative
+        arrays (e.g. slices of an archive or collection) without copying
+        them. Arrays that are not contiguous floating point arrays are
+        converted to float64. stats is an optional (min_dose, max_dose,
+        mean_dose) tuple.
+
+        The arrays are trusted as is unless validate is True, in which case
+        a cheap check that they describe a padded, normalized cumulative DVH
+        is done.
+        """
+
+        arrays = [doses, cum_volumes] + ([] if diff_volumes is None else [diff_volumes])
+        arrays = [
+            a if isinstance(a, np.ndarray) and a.dtype.kind == "f" and a.flags.c_contiguous
+            else np.ascontiguousarray(a, dtype=np.float64)
+            for a in arrays
+        ]
+        doses, cum_volumes = arrays[:2]
+        diff_volumes = arrays[2] if len(arrays) > 2 else None
+
+        if validate:
+            if len(set(len(a) for a in arrays)) != 1 or len(doses) < 3:
+                raise ValueError("Mismatch between length of volumes and dose arrays")
+            if doses[0] != 0 or cum_volumes[0] != 1 or cum_volumes[-1] != 0:
+                raise ValueError("DVH data is not a zero padded normalized cumulative DVH")
+            if not monotonic_increasing(doses) or not monotonic_decreasing(cum_volumes):
+                raise ValueError("DVH data is not monotonic")
+
+        return cls._from_arrays(doses, cum_volumes, diff_volumes, stats, max_at_zero_vol)
+
+    @classmethod
+    def from_json(cls, data, validate=False, max_at_zero_vol=False):
+        """Create a DVH from the output of dvh.serialize("json")"""
+        return cls.from_dict(json.loads(data), validate, max_at_zero_vol)
+
+    @instrumented("DVH._set_volumes", _curve_size)
+    def _set_volumes(self, volumes):
+        """Normalize volumes in place and store them as cum_volumes"""
+
+        volumes /= volumes.max()
+        self.cum_volumes = volumes
 
         # sanity check
-        assert len(self.doses) == len(self.diff_volumes) and len(self.diff_volumes) == len(self.cum_volumes)
+        assert len(self.doses) == len(self.cum_volumes)
+
+    def invalidate(self):
+        """Discard all derived and cached values. This is done automatically
+        when doses or cum_volumes are set but must be called manually after
+        modifying either array in place.
+        """
+
+        self._diff_volumes = None
+        self._mean_dose = self._min_dose = self._max_dose = None
+        self._bin_width = self._volume_table = None
+        if self._cache is not None:
+            self._cache_token = next(_cache_tokens)
+
+    @property
+    def doses(self):
+        if self._dose_quantum is None:
+            return self._doses
+        return self._doses*self._dose_quantum
+
+    @doses.setter
+    def doses(self, doses):
+        self._doses = doses
+        self._dose_quantum = None
+        self.invalidate()
+
+    @property
+    def cum_volumes(self):
+        return self._cum_volumes
+
+    @cum_volumes.setter
+    def cum_volumes(self, cum_volumes):
+        self._cum_volumes = cum_volumes
+        self.invalidate()
+
+    @property
+    def bin_width(self):
+        """The dose spacing if the doses after the zero dose point are evenly
+        spaced (as for DVHs created from histograms) or None otherwise.
+
+        Uniform bin DVHs answer scalar queries in constant time. Spacing is
+        detected on first access but may be declared by setting bin_width.
+        Queries are exact whatever value is declared, a wrong spacing only
+        makes them slower.
+        """
+
+        if self._bin_width is None:
+            self._bin_width = self._detect_bin_width()
+        return self._bin_width or None
+
+    @bin_width.setter
+    def bin_width(self, bin_width):
+        if bin_width is not None and not bin_width > 0:
+            raise ValueError("bin_width must be positive")
+        self._bin_width = bin_width
+        self._volume_table = None
+
+    def _detect_bin_width(self):
+        ds = self.doses.astype(np.float64, copy=False)
+        if self._dose_quantum is not None or len(ds) < 3:
+            return 0.
+
+        step = (ds[-1] - ds[1])/(len(ds) - 2)
+        if step > 0 and np.all(np.abs(np.diff(ds[1:]) - step) <= UNIFORM_BIN_RTOL*step):
+            return step
+        return 0.
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the arrays stored by this DVH"""
+        arrays = [self._doses, self._cum_volumes, self._diff_volumes]
+        unique = dict((id(a), a) for a in arrays if a is not None)
+        return sum(a.nbytes for a in unique.values())
+
+    def astype(self, dtype):
+        """Return a copy of this DVH storing its arrays as dtype (e.g.
+        np.float32). The dose stats are carried over from this DVH.
+        """
+
+        if np.dtype(dtype).kind != "f":
+            raise ValueError("dtype must be a floating point type not {0}".format(np.dtype(dtype)))
+
+        diff_volumes = None if self._diff_volumes is None else self._diff_volumes.astype(dtype)
+        return self._from_arrays(
+            self.doses.astype(dtype), self.cum_volumes.astype(dtype), diff_volumes,
+            stats=(self.min_dose, self.max_dose, self.mean_dose),
+            max_at_zero_vol=self.max_at_zero_vol,
+        )
+
+    def quantize_doses(self, quantum=None):
+        """Return a copy of this DVH storing its doses as uint16 multiples of
+        quantum, for curves with doses on a uniform grid. quantum defaults
+        to half the smallest dose step so bin centre doses are representable.
+        Raises ValueError if the doses can not be stored exactly.
+        """
+
+        doses = np.asarray(self.doses, dtype=np.float64)
+        if quantum is None:
+            steps = np.diff(doses)
+            quantum = steps[steps > 0].min()/2.
+
+        codes = np.round(doses/quantum)
+        if codes.max() > np.iinfo(np.uint16).max:
+            raise ValueError("Doses are too large to quantize with a quantum of %.3G" % quantum)
+        if not np.allclose(codes*quantum, doses, rtol=0, atol=1E-6*quantum):
+            raise ValueError("Doses are not multiples of a quantum of %.3G" % quantum)
+
+        dvh = self._from_arrays(
+            codes.astype(np.uint16), self.cum_volumes, self._diff_volumes,
+            stats=(self.min_dose, self.max_dose, self.mean_dose),
+            max_at_zero_vol=self.max_at_zero_vol,
+        )
+        dvh._dose_quantum = float(quantum)
+        return dvh
+
+    def simplify(self, dose_tolerance, volume_tolerance):
+        """Return a DVH with the points of this curve that are not needed to
+        answer every dose_to_volume_fraction & volume_fraction_receiving_dose
+        query to within dose_tolerance and volume_tolerance removed.
+
+        Points are added Ramer-Douglas-Peucker style, splitting every chord
+        at its worst point until all original points lie within the
+        tolerances of the simplified curve both along the dose and the
+        volume axis. Chords are then split where they gain the most until the
+        mean dose recalculated from the kept points is also within
+        dose_tolerance of the mean dose of this curve. The leading points and
+        the min & max dose points are always kept and the dose stats are
+        carried over unchanged.
+        """
+
+        if dose_tolerance < 0 or volume_tolerance < 0:
+            raise ValueError("Tolerances must not be negative")
 
+        ds = self.doses.astype(np.float64, copy=False)
+        vs = self.cum_volumes.astype(np.float64, copy=False)
+        n = len(ds)
+
+        nonzero = np.where(self.diff_volumes > 0)[0]
+        required = [0, 1, 2, nonzero[0], nonzero[-1], nonzero[-1] + 1, n - 1]
+        kept = np.unique(np.clip(required, 0, n - 1))
+
+        points = np.arange(n)
+        dose_scale = max(dose_tolerance, 1E-300)
+        volume_scale = max(volume_tolerance, 1E-300)
+
+        # contribution of each point to the mean dose
+        contributions = ds*self.diff_volumes.astype(np.float64, copy=False)
+
+        while True:
+            segment = np.searchsorted(kept, points, side="right") - 1
+            k0 = kept[segment]
+            k1 = kept[np.minimum(segment + 1, len(kept) - 1)]
+            dd, dv = ds[k1] - ds[k0], vs[k1] - vs[k0]
+
+            # distance of each point from its chord along each axis
+            with np.errstate(divide="ignore", invalid="ignore"):
+                volume_error = np.where(dd != 0, np.abs(vs - (vs[k0] + dv*(ds - ds[k0])/dd)), 0.)
+                dose_error = np.where(dv != 0, np.abs(ds - (ds[k0] + dd*(vs - vs[k0])/dv)), 0.)
+
+            exceeded = np.where((volume_error > volume_tolerance) | (dose_error > dose_tolerance))[0]
+            if len(exceeded):
+                # split each chord at its worst point
+                score = np.maximum(volume_error[exceeded]/volume_scale, dose_error[exceeded]/dose_scale)
+            else:
+                # mean dose error of each chord, i.e. the contributions of its
+                # points less the contribution of its start on the kept curve
+                kept_contributions = ds[kept]*np.append(vs[kept[:-1]] - vs[kept[1:]], vs[kept[-1]])
+                mean_error = np.abs(np.add.reduceat(contributions, kept) - kept_contributions)
+                if mean_error.sum() <= dose_tolerance:
+                    break
+
+                # split the chords with the largest errors until the rest are
+                # within half the tolerance, each where it reduces the error most
+                order = np.argsort(mean_error)[::-1]
+                remaining = mean_error.sum() - np.cumsum(mean_error[order])
+                split = order[:np.argmax(remaining <= dose_tolerance/2.) + 1]
+                exceeded = np.where(np.isin(segment, split) & (points != k0) & (points != k1))[0]
+                if not len(exceeded):
+                    break
+                score = (ds[exceeded] - ds[k0[exceeded]])*(vs[exceeded] - vs[k1[exceeded]])
+
+            order = np.lexsort((score, segment[exceeded]))
+            segments = segment[exceeded][order]
+            worst = exceeded[order][np.append(segments[1:] != segments[:-1], True)]
+            kept = np.union1d(kept, worst)
+
+        return self._from_arrays(
+            self.doses[kept], self.cum_volumes[kept],
+            stats=(self.min_dose, self.max_dose, self.mean_dose),
+            max_at_zero_vol=self.max_at_zero_vol,
+        )
+
+    @property
+    def cache(self):
+        """The MetricCache used for queries or None if caching is disabled"""
+        return self._cache
+
+    def enable_cache(self, maxsize=128, cache=None):
+        """Cache the results of scalar dose_to_volume_fraction and
+        volume_fraction_receiving_dose queries. Pass an existing MetricCache
+        to share a single bounded cache between many DVHs, otherwise a new
+        cache holding up to maxsize results is created.
+        """
+
+        self._cache = cache if cache is not None else MetricCache(maxsize)
+        self._cache_token = next(_cache_tokens)
+        return self._cache
+
+    def disable_cache(self):
+        self._cache = None
+
+    def _cached_query(self, name, query, argument):
+        if np.ndim(argument) != 0:
+            return query(argument)
+        return self._cache.get((self._cache_token, name, float(argument)), lambda: query(argument))
+
+    @property
+    def diff_volumes(self):
+        if self._diff_volumes is None:
+            vs = self.cum_volumes.astype(np.float64, copy=False)
+            diff_volumes = np.append(np.diff(vs[::-1])[::-1], vs[-1])
+            self._diff_volumes = diff_volumes.astype(self.cum_volumes.dtype, copy=False)
+        return self._diff_volumes
+
+    @property
+    def mean_dose(self):
+        if self._mean_dose is None:
+            self._mean_dose = (self.doses.astype(np.float64, copy=False) * self.diff_volumes).sum()
+        return self._mean_dose
+
+    @property
+    def min_dose(self):
+        if self._min_dose is None:
+            self._calculate_stats()
+        return self._min_dose
+
+    @property
+    def max_dose(self):
+        if self._max_dose is None:
+            self._calculate_stats()
+        return self._max_dose
+
+    @instrumented("DVH._calculate_stats", _curve_size)
     def _calculate_stats(self):
-        self.mean_dose = (self.doses * self.diff_volumes).sum()
         nonzero = np.where(self.diff_volumes > 0)[0]
+        ds = self.doses.astype(np.float64, copy=False)
 
         # special case to handle Monaco min dose = 0
-        if self.doses[1] == (self.doses[2] - self.doses[1]) // 2:
-            self.min_dose = 0.
+        if ds[1] == (ds[2] - ds[1]) // 2:
+            self._min_dose = 0.
         else:
-            self.min_dose = self.doses[nonzero[0]]
+            self._min_dose = ds[nonzero[0]]
 
-        if self.max_at_zero_vol and len(self.doses) > nonzero[-1]:
-            self.max_dose = self.doses[nonzero[-1] + 1]
+        if self.max_at_zero_vol and len(ds) > nonzero[-1]:
+            self._max_dose = ds[nonzero[-1] + 1]
         else:
-            self.max_dose = self.doses[nonzero[-1]]
+            self._max_dose = ds[nonzero[-1]]
 
+    @instrumented("DVH.dose_to_volume_fraction", _curve_size)
     def dose_to_volume_fraction(self, volume_fraction):
         """Return the dose that receives at least volume_fraction % dose (e.g.
         dvh.dose_to_volume_fraction(0.9) == D90% ).
         Doses are linearly interpreted between two enclosing bin centres.
-        """
-
-        if volume_fraction < 0. or volume_fraction > 1.:
-            raise ValueError("%.3G is outside expected volume fraction range of 0 <= v <= 1" % (volume_fraction))
 
-        if volume_fraction == 0:
-            return self.max_dose
-        elif volume_fraction == 1.:
-            return self.min_dose
+        volume_fraction may be a scalar or an array of volume fractions, in
+        which case an array of doses of the same shape is returned.
+        """
 
-        try:
-            lower_idx = np.where(self.cum_volumes >= volume_fraction)[0][-1]
-            l, u = lower_idx, lower_idx+1
-            ds, vs = self.doses, self.cum_volumes
-            return ds[l] + (ds[u] - ds[l])*(volume_fraction - vs[l]) / (vs[u] - vs[l])
-        except IndexError:  # pragma:nocover
-            # should never hit this since we always stick have a zero volume point on end of dvh
-            raise ValueError("DVH is truncated.  Unable to calculate dose to requested volume fraction")
+        if self._cache is not None:
+            return self._cached_query("D", self._dose_to_volume_fraction, volume_fraction)
+        return self._dose_to_volume_fraction(volume_fraction)
 
+    @instrumented("DVH.volume_fraction_receiving_dose", _curve_size)
     def volume_fraction_receiving_dose(self, dose):
         """ Return the fraction of total volume recieving at least the input dose. (e.g.
         dvh.volume_fraction_receiving_dose(50) == V50Gy ).
 
         Volumes are linearly interpreted between two enclosing points.
+
+        dose may be a scalar or an array of doses, in which case an array of
+        volume fractions of the same shape is returned.
         """
 
-        if dose > self.max_dose:
-            return 0
-        elif dose <= self.min_dose:
-            return 1.
+        if self._cache is not None:
+            return self._cached_query("V", self._volume_fraction_receiving_dose, dose)
+        return self._volume_fraction_receiving_dose(dose)
 
-        lower_idx = np.where(self.doses <= dose)[0][-1]
-        l, u = lower_idx, lower_idx + 1
-        ds, vs = self.doses, self.cum_volumes
+    def _dose_to_volume_fraction(self, volume_fraction):
+        if isinstance(volume_fraction, _SCALAR_TYPES) and self.bin_width:
+            dose = self._uniform_dose_to_volume_fraction(float(volume_fraction))
+            if dose is not None:
+                return dose
 
-        return vs[l]+(vs[u]-vs[l])*(dose-ds[l])/(ds[u]-ds[l])
+        fractions = np.asarray(volume_fraction, dtype=np.float64)
 
+        invalid = (fractions < 0.) | (fractions > 1.)
+        if invalid.any():
+            raise ValueError("%.3G is outside expected volume fraction range of 0 <= v <= 1" % (fractions[invalid].flat[0]))
+
+        ds = self.doses.astype(np.float64, copy=False)
+        vs = self.cum_volumes.astype(np.float64, copy=False)
+
+        # cum_volumes is monotonically decreasing so the points with
+        # vs >= fraction form a prefix and reversing gives an ascending
+        # view suitable for a binary search. We always have a zero volume
+        # point at the end of the dvh so lower_idx is never the last point
+        # for fractions > 0.
+        lower_idx = len(vs) - 1 - np.searchsorted(vs[::-1], fractions, side="left")
+        lo = np.clip(lower_idx, 0, len(vs) - 2)
+        hi = lo + 1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            doses = ds[lo] + (ds[hi] - ds[lo])*(fractions - vs[lo]) / (vs[hi] - vs[lo])
+
+        # only touch the (lazily calculated) stats when they are needed
+        if (fractions == 0).any():
+            doses = np.where(fractions == 0, self.max_dose, doses)
+        if (fractions == 1.).any():
+            doses = np.where(fractions == 1., self.min_dose, doses)
+
+        return doses[()]
+
+    def _volume_fraction_receiving_dose(self, dose):
+        if isinstance(dose, _SCALAR_TYPES) and self.bin_width:
+            volume = self._uniform_volume_fraction_receiving_dose(float(dose))
+            if volume is not None:
+                return volume
+
+        doses = np.asarray(dose, dtype=np.float64)
+        ds = self.doses.astype(np.float64, copy=False)
+        vs = self.cum_volumes.astype(np.float64, copy=False)
+
+        lower_idx = np.searchsorted(ds, doses, side="right") - 1
+        lo = np.clip(lower_idx, 0, len(ds) - 2)
+        hi = lo + 1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volumes = vs[lo]+(vs[hi]-vs[lo])*(doses-ds[lo])/(ds[hi]-ds[lo])
+
+        volumes = np.where(doses <= self.min_dose, 1., volumes)
+        volumes = np.where(doses > self.max_dose, 0., volumes)
+
+        return volumes[()]
+
+    # The uniform bin fast paths below find the same interpolation points
+    # as the searchsorted based general paths and repeat their arithmetic on
+    # float64 scalars so results are identical. They return None for the
+    # (rare) arguments they leave to the general paths.
+
+    def _uniform_volume_fraction_receiving_dose(self, dose):
+        if math.isnan(dose) or math.isinf(dose) or self._dose_quantum is not None:
+            return None
+
+        if dose > self.max_dose:
+            return np.float64(0.)
+        if dose <= self.min_dose:
+            return np.float64(1.)
+
+        ds, vs, n = self._doses, self._cum_volumes, len(self._doses)
+
+        # estimate the last point with ds[lo] <= dose from the bin spacing and
+        # step to it to correct for rounding. A bin_width far from the real
+        # spacing leaves the estimate far off so after a few steps fall back
+        # to a binary search.
+        first = float(ds[1])
+        if dose < first:
+            lo = 0 if dose >= float(ds[0]) else -1
+        else:
+            lo = min(1 + int((dose - first)/self._bin_width), n - 1)
+        for _ in range(_UNIFORM_MAX_STEPS):
+            if lo + 1 < n and float(ds[lo + 1]) <= dose:
+                lo += 1
+            elif lo >= 0 and float(ds[lo]) > dose:
+                lo -= 1
+            else:
+                break
+        else:
+            lo = int(np.searchsorted(ds.astype(np.float64, copy=False), dose, side="right")) - 1
+
+        lo = min(max(lo, 0), n - 2)
+        dl, du, vl, vu = float(ds[lo]), float(ds[lo + 1]), float(vs[lo]), float(vs[lo + 1])
+        if du == dl:
+            return None
+        return np.float64(vl+(vu-vl)*(dose-dl)/(du-dl))
+
+    def _uniform_dose_to_volume_fraction(self, fraction):
+        if not 0 < fraction < 1 or self._dose_quantum is not None:
+            return None
+
+        ds, vs = self._doses, self._cum_volumes
+
+        # _volume_table[b] is the last point with vs >= b/K. Start from the
+        # table entry of a volume at least fraction and step forward to the
+        # last point with vs >= fraction, which is no further than the table
+        # entry of a volume at most fraction. Many points can share one
+        # level (e.g. long low volume tails) so after a few steps the rest
+        # of that range is binary searched.
+        if self._volume_table is None:
+            levels = np.arange(len(vs) + 1)/float(len(vs))
+            vs64 = vs.astype(np.float64, copy=False)
+            self._volume_table = len(vs) - 1 - np.searchsorted(vs64[::-1], levels, side="left")
+
+        table, last = self._volume_table, len(vs) - 2
+        level = int(fraction*(len(table) - 1))
+        lo = max(int(table[min(level + 2, len(table) - 1)]), 0)
+        for _ in range(_UNIFORM_MAX_STEPS):
+            if lo >= last or float(vs[lo + 1]) < fraction:
+                break
+            lo += 1
+        else:
+            upper = min(int(table[max(level - 1, 0)]), last)
+            ascending = vs[upper:lo:-1].astype(np.float64)
+            lo = min(upper - int(np.searchsorted(ascending, fraction, side="left")), last)
+
+        dl, du, vl, vu = float(ds[lo]), float(ds[lo + 1]), float(vs[lo]), float(vs[lo + 1])
+        if vu == vl:
+            return None
+        return np.float64(dl + (du - dl)*(fraction - vl) / (vu - vl))
+
+    @instrumented("DVH.serialize", _curve_size)
     def serialize(self, method="json", with_diff=True):
 
         if method not in self.serializers:
             msg = "method must be one of {0} not {1}".format(','.join(self.serializers.keys()), method)
             raise TypeError(msg)
 
-        return self.serializers[method](self.to_dict(with_diff))
+        serializer = self.serializers[method]
+        if getattr(serializer, "takes_dvh", False):
+            return serializer(self, with_diff)
+        return serializer(self.to_dict(with_diff))
 
     def to_dict(self, with_diff=True):
         """Return dvh data in dictionary like :
@@ -157,5 +785,24 @@ class DVH(object):
 
         return d
 
-    def _json_serialize(self, data):
-        return json.dumps(data)
+    def _binary_serialize(self, with_diff=True, dtype="<f8"):
+        """Return dvh data as a fixed size header (see BINARY_HEADER)
+        followed by the raw little endian doses, cum_volumes and (only if
+        with_diff is truthy) diff_volumes arrays.
+        """
+
+        dtype = np.dtype(dtype)
+        flags = BINARY_WITH_DIFF if with_diff else 0
+        if self.max_at_zero_vol:
+            flags |= BINARY_MAX_AT_ZERO_VOL
+
+        header = BINARY_HEADER.pack(
+            BINARY_MAGIC, BINARY_VERSION, dtype.itemsize, flags, len(self.doses),
+            self.min_dose, self.max_dose, self.mean_dose,
+        )
+
+        arrays = [self.doses, self.cum_volumes]
+        if with_diff:
+            arrays.append(self.diff_volumes)
+
+        return header + b"".join(np.asarray(a, dtype=dtype).tobytes() for a in arrays)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio pipeline ingesting text DVH exports into serialized DVH storage.
+
+Files flow through read -> parse -> construct -> serialize -> write stages
+connected by bounded asyncio queues, so a slow stage applies backpressure
+upstream instead of letting items pile up in memory. Reads and writes run
+on an I/O thread pool while parsing, DVH construction and serialization run
+on a (caller supplied, e.g. ProcessPoolExecutor) executor, letting I/O and
+compute overlap.
+
+    pipeline = IngestPipeline(DirectorySource("drop/"), DirectorySink("store/"))
+    asyncio.run(pipeline.run())
+    pipeline.metrics()
+"""
+
+import asyncio
+import fnmatch
+import functools
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import parsers
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+# end of stream marker passed once to each worker of a stage
+_DONE = object()
+
+
+class DirectorySource(object):
+    """Export files matching pattern in a local drop directory, keyed by
+    file name.
+    """
+
+    def __init__(self, directory, pattern="*"):
+        self.directory = directory
+        self.pattern = pattern
+
+    def keys(self):
+        for entry in os.scandir(self.directory):
+            if fnmatch.fnmatch(entry.name, self.pattern) and entry.is_file():
+                yield entry.name
+
+    def read(self, key):
+        with open(os.path.join(self.directory, key), "rb") as f:
+            return f.read()
+
+
+class ObjectStoreSource(object):
+    """Objects of a bucket in a local object store stand in, where bucket
+    is a directory under root and keys are "/" separated paths relative to
+    it. Only keys starting with prefix are listed.
+    """
+
+    def __init__(self, root, bucket, prefix=""):
+        self.root = root
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _path(self, key):
+        return os.path.join(self.root, self.bucket, *key.split("/"))
+
+    def keys(self):
+        base = os.path.join(self.root, self.bucket)
+        for directory, _, names in os.walk(base):
+            relative = os.path.relpath(directory, base).replace(os.sep, "/")
+            for name in sorted(names):
+                key = name if relative == "." else relative + "/" + name
+                if key.startswith(self.prefix):
+                    yield key
+
+    def read(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+
+def _safe_name(name):
+    name = re.sub(r"[^\w.-]+", "_", name)
+    return "_" if name in ("", ".", "..") else name
+
+
+class DirectorySink(object):
+    """Writes each serialized DVH to its own file in directory. The "/"
+    separated parts of the source key become subdirectories and the file is
+    named after the last part of the key and the structure, so distinct keys
+    never share a file. Existing files (e.g. from two structure names that
+    only differ in characters replaced in file names, or an earlier run) are
+    never overwritten, writing one raises a ValueError instead.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key, structure, payload):
+        parts = [_safe_name(p) for p in key.replace("\\", "/").split("/")]
+        stem = os.path.splitext(parts[-1])[0]
+        name = _safe_name("{0}__{1}".format(stem, structure)) + (".json" if isinstance(payload, str) else ".dvhb")
+        return os.path.join(self.directory, *(parts[:-1] + [name]))
+
+    def write(self, key, structure, payload):
+        path = self.path(key, structure, payload)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        try:
+            f = open(path, "xb")
+        except FileExistsError:
+            raise ValueError("{0} {1} would overwrite {2}".format(key, structure, path))
+        with f:
+            f.write(payload)
+
+
+# Stage functions take one item and return a list of items for the next
+# stage. They are module level so they can run in a process pool.
+
+def _read(source, item):
+    return [(item, source.read(item))]
+
+
+def _parse(fmt, item):
+    key, data = item
+    return [(key, list(parsers.iter_records(data.decode("utf-8", "replace"), fmt)))]
+
+
+def _construct(max_at_zero_vol, item):
+    key, records = item
+    return [(key, name, dvh) for name, dvh in parsers.iter_dvhs(records, max_at_zero_vol)]
+
+
+def _serialize(method, with_diff, item):
+    key, name, dvh = item
+    return [(key, name, dvh.serialize(method, with_diff))]
+
+
+def _write(sink, item):
+    key, name, payload = item
+    sink.write(key, name, payload)
+    return []
+
+
+class Stage(object):
+    """One step of the pipeline run by workers tasks, each taking items
+    from the stage's bounded inbox, running func on executor and putting
+    the results in the next stage's inbox.
+    """
+
+    def __init__(self, name, func, executor=None, workers=1):
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.workers = workers
+
+        self.inbox = None
+        self.items = 0
+        self.errors = []
+        self.busy_time = 0.
+        self.max_queue_depth = 0
+
+    async def put(self, item):
+        await self.inbox.put(item)
+        self.max_queue_depth = max(self.max_queue_depth, self.inbox.qsize())
+
+    async def _work(self, outbox):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.inbox.get()
+            if item is _DONE:
+                return
+
+            start = _clock()
+            try:
+                results = await loop.run_in_executor(self.executor, self.func, item)
+            except Exception as e:
+                # items are tuples keyed by source key, except for the read stage
+                key = item[0] if isinstance(item, tuple) else item
+                self.errors.append((key, "{0}: {1}".format(type(e).__name__, e)))
+                continue
+            finally:
+                self.busy_time += _clock() - start
+
+            self.items += 1
+
+            if outbox is not None:
+                for result in results:
+                    await outbox.put(result)
+
+    async def run(self, outbox):
+        await asyncio.gather(*[self._work(outbox) for _ in range(self.workers)])
+        if outbox is not None:
+            for _ in range(outbox.workers):
+                await outbox.inbox.put(_DONE)
+
+
+class IngestPipeline(object):
+    """Reads text DVH exports from source, builds DVHs for every structure
+    and writes them serialized with method ("binary", "binary32" or "json")
+    to sink.
+
+    source is any object with keys() and read(key) -> bytes methods and
+    sink any object with a write(key, structure, payload) method.
+    executor runs the CPU bound stages (the event loop's default executor
+    if None) and io_workers threads run reads and writes. Each queue holds
+    at most queue_size items.
+    """
+
+    def __init__(self, source, sink, method="binary", with_diff=True, fmt="auto", max_at_zero_vol=False,
+                 executor=None, io_workers=4, cpu_workers=4, queue_size=16):
+
+        self.source = source
+        self.sink = sink
+        self.queue_size = queue_size
+        self.io_workers = io_workers
+
+        # the read & write stages get their thread pool when run
+        self.stages = [
+            Stage("read", functools.partial(_read, source), None, io_workers),
+            Stage("parse", functools.partial(_parse, fmt), executor, cpu_workers),
+            Stage("construct", functools.partial(_construct, max_at_zero_vol), executor, cpu_workers),
+            Stage("serialize", functools.partial(_serialize, method, with_diff), executor, cpu_workers),
+            Stage("write", functools.partial(_write, sink), None, io_workers),
+        ]
+
+        self._start = self._end = None
+
+    async def _produce(self):
+        first = self.stages[0]
+        for key in self.source.keys():
+            await first.put(key)
+        for _ in range(first.workers):
+            await first.inbox.put(_DONE)
+
+    async def run(self):
+        """Run the pipeline until every file from source has been written.
+        Returns metrics().
+        """
+
+        io_executor = ThreadPoolExecutor(self.io_workers)
+        self.stages[0].executor = self.stages[-1].executor = io_executor
+        for stage in self.stages:
+            stage.inbox = asyncio.Queue(self.queue_size)
+
+        self._start, self._end = _clock(), None
+        try:
+            outboxes = self.stages[1:] + [None]
+            await asyncio.gather(self._produce(), *[s.run(o) for s, o in zip(self.stages, outboxes)])
+        finally:
+            self._end = _clock()
+            io_executor.shutdown()
+
+        return self.metrics()
+
+    def metrics(self):
+        """Return per stage metrics (which may be polled while running) like:
+            {
+                "read": {
+                    "items": 120,           # items processed successfully
+                    "errors": 0,
+                    "busy_time": 0.52,      # summed over the stage workers
+                    "throughput": 230.8,    # items per second of wall time
+                    "queue_depth": 3,       # items waiting in the stage inbox
+                    "max_queue_depth": 16,
+                },
+                ...
+            }
+        """
+
+        if self._start is None:
+            elapsed = 0.
+        else:
+            elapsed = (self._end if self._end is not None else _clock()) - self._start
+
+        return dict(
+            (stage.name, {
+                "items": stage.items,
+                "errors": len(stage.errors),
+                "busy_time": stage.busy_time,
+                "throughput": stage.items/elapsed if elapsed > 0 else 0.,
+                "queue_depth": stage.inbox.qsize() if stage.inbox is not None else 0,
+                "max_queue_depth": stage.max_queue_depth,
+            })
+            for stage in self.stages
+        )
+
+    @property
+    def errors(self):
+        """List of (stage name, source key, error message) for all failed items"""
+        return [(stage.name, key, error) for stage in self.stages for key, error in stage.errors]
+
+
+def ingest(source, sink, **kwargs):
+    """Run an IngestPipeline (see its arguments) to completion and return it"""
+
+    pipeline = IngestPipeline(source, sink, **kwargs)
+    asyncio.run(pipeline.run())
+    return pipeline
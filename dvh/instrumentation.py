@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in instrumentation of the DVH hot paths.
+
+When enabled, every instrumented operation records its call count,
+cumulative wall time and a histogram of the array sizes it worked on, and
+is passed to any registered sinks. Instrumented methods are only swapped
+for their recording wrappers while instrumentation is enabled so when it
+is disabled (the default) they are the original, undecorated functions.
+"""
+
+import functools
+import logging
+import time
+
+
+_enabled = False
+_sinks = []
+_stats = {}
+
+# (owner class, attribute name, function, wrapper) of instrumented methods
+_methods = []
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+def enable(sink=None):
+    """Turn instrumentation on, optionally registering sink (see add_sink)"""
+
+    global _enabled
+    if sink is not None:
+        add_sink(sink)
+    _enabled = True
+    for owner, name, _, wrapper in _methods:
+        setattr(owner, name, wrapper)
+
+
+def disable():
+    """Turn instrumentation off. Collected stats are kept until reset()"""
+
+    global _enabled
+    _enabled = False
+    for owner, name, func, _ in _methods:
+        setattr(owner, name, func)
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_sink(sink):
+    """Register sink, a callable called as sink(operation, elapsed, size)
+    after each instrumented call.
+    """
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    _sinks.remove(sink)
+
+
+def logging_sink(logger=None, level=logging.DEBUG):
+    """Return a sink writing one log record per instrumented call"""
+
+    logger = logger or logging.getLogger("dvh")
+
+    def sink(operation, elapsed, size):
+        logger.log(level, "%s took %.6fs (size=%d)", operation, elapsed, size)
+
+    return sink
+
+
+def size_bucket(size):
+    """Return the power of two upper bound of size used in the size histograms"""
+    return 1 << (int(size) - 1).bit_length() if size > 0 else 0
+
+
+def record(operation, elapsed, size=0):
+    """Record one call of operation taking elapsed seconds on size elements"""
+
+    entry = _stats.get(operation)
+    if entry is None:
+        entry = _stats[operation] = {"calls": 0, "total_time": 0., "sizes": {}}
+
+    entry["calls"] += 1
+    entry["total_time"] += elapsed
+    bucket = size_bucket(size)
+    entry["sizes"][bucket] = entry["sizes"].get(bucket, 0) + 1
+
+    for sink in _sinks:
+        sink(operation, elapsed, size)
+
+
+def stats():
+    """Return the stats collected so far like:
+        {
+            "DVH.__init__": {
+                "calls": 12,
+                "total_time": 0.0031,
+                "sizes": {64: 2, 512: 10},  # size bucket -> calls
+            },
+            ...
+        }
+    """
+
+    return dict(
+        (operation, {"calls": e["calls"], "total_time": e["total_time"], "sizes": dict(e["sizes"])})
+        for operation, e in _stats.items()
+    )
+
+
+def reset():
+    """Discard all collected stats"""
+    _stats.clear()
+
+
+class _Instrumented(object):
+    """Placeholder left in a class body by instrumented. When the class is
+    created it puts the original function back on the class and registers
+    it so enable() and disable() can swap it with the recording wrapper.
+    Outside of a class body it simply calls the right one of the two.
+    """
+
+    def __init__(self, func, wrapper):
+        self.func = func
+        self.wrapper = wrapper
+        functools.update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        _methods.append((owner, name, self.func, self.wrapper))
+        setattr(owner, name, self.wrapper if _enabled else self.func)
+
+    def __call__(self, *args, **kwargs):
+        return (self.wrapper if _enabled else self.func)(*args, **kwargs)
+
+
+def instrumented(operation, size=None):
+    """Decorator recording calls of the decorated function (normally a
+    method) as operation. size is an optional function called with the same
+    arguments as the decorated function returning the array size to record.
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = _clock() - start
+                record(operation, elapsed, size(*args, **kwargs) if size else 0)
+
+        return _Instrumented(func, wrapper)
+
+    return decorator
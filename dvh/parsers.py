@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Readers for text DVH exports from treatment planning systems.
+
+Each file is read in one go and its numeric columns converted in bulk, but
+structures are yielded one at a time and directories are processed one file
+at a time so an export directory is never held in memory all at once.
+
+Supported layouts:
+
+monaco
+    Optional header lines followed by one row per DVH point of the form
+    "<structure name> <dose> <volume>" (tab, space, comma or | separated).
+    Rows of a structure are contiguous.
+
+eclipse
+    One section per structure starting with a "Structure: <name>" line.
+    Each section has a column header line (e.g. "Dose [cGy]  Relative dose
+    [%]  Ratio of Total Structure Volume [%]") followed by numeric rows. The
+    absolute dose column (or the first column) is used for doses and the
+    last column for volumes.
+
+Both cumulative and differential exports are supported since DVH detects
+differential volumes itself.
+"""
+
+import glob
+import io
+import os
+import re
+
+import numpy as np
+
+from .dvh import DVH
+
+
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+
+MONACO_ROW_RE = re.compile(
+    r"^[ \t]*(?P<name>\S.*?)[ \t|,]+(?P<dose>%s)[ \t|,]+(?P<volume>%s)[ \t|,]*\r?$" % (NUMBER, NUMBER),
+    re.MULTILINE,
+)
+
+ECLIPSE_STRUCTURE_RE = re.compile(r"^[ \t]*Structure[ \t]*:[ \t]*(?P<name>.*?)[ \t]*\r?$", re.MULTILINE)
+ECLIPSE_HEADER_RE = re.compile(r"^.*Dose.*Volume.*$", re.MULTILINE | re.IGNORECASE)
+ECLIPSE_ROW_RE = re.compile(r"^[ \t]*%s(?:[ \t]+%s)+[ \t]*\r?$" % (NUMBER, NUMBER), re.MULTILINE)
+ECLIPSE_ABS_DOSE_RE = re.compile(r"^Dose \[c?Gy\]$", re.IGNORECASE)
+
+FORMATS = ("monaco", "eclipse")
+
+
+def detect_format(text):
+    """Return the name of the export format of text"""
+    return "eclipse" if ECLIPSE_STRUCTURE_RE.search(text) else "monaco"
+
+
+def _to_array(values):
+    return np.array(values, dtype=np.float64)
+
+
+def _iter_monaco_records(text):
+
+    rows = MONACO_ROW_RE.findall(text)
+    if not rows:
+        return
+
+    names, doses, volumes = zip(*rows)
+    doses, volumes = _to_array(doses), _to_array(volumes)
+
+    # rows of each structure are contiguous so split where the name changes
+    breaks = [i for i in range(1, len(names)) if names[i] != names[i - 1]]
+    bounds = [0] + breaks + [len(names)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield names[start], doses[start:end], volumes[start:end]
+
+
+def _iter_eclipse_records(text):
+
+    matches = list(ECLIPSE_STRUCTURE_RE.finditer(text))
+    ends = [m.start() for m in matches[1:]] + [len(text)]
+
+    for match, end in zip(matches, ends):
+        section = text[match.end():end]
+        header = ECLIPSE_HEADER_RE.search(section)
+        if header is None:
+            continue
+
+        rows = ECLIPSE_ROW_RE.findall(section, header.end())
+        if not rows:
+            continue
+
+        columns = [c.strip() for c in re.split(r"\s{2,}|\t", header.group(0).strip())]
+        dose_col = next((i for i, c in enumerate(columns) if ECLIPSE_ABS_DOSE_RE.match(c)), 0)
+
+        data = _to_array(" ".join(rows).split()).reshape(len(rows), -1)
+        yield match.group("name"), data[:, dose_col], data[:, -1]
+
+
+def iter_records(text, fmt="auto"):
+    """Yield (structure name, doses, volumes) raw arrays for each structure
+    in the text of an export. fmt is one of monaco, eclipse or auto.
+    """
+
+    if fmt == "auto":
+        fmt = detect_format(text)
+
+    if fmt == "monaco":
+        records = _iter_monaco_records(text)
+    elif fmt == "eclipse":
+        records = _iter_eclipse_records(text)
+    else:
+        raise ValueError("fmt must be one of auto,{0} not {1}".format(','.join(FORMATS), fmt))
+
+    for record in records:
+        yield record
+
+
+def iter_dvhs(records, max_at_zero_vol=False):
+    """Yield (structure name, DVH) for each (structure name, doses, volumes)
+    record with non zero volume.
+    """
+
+    for name, doses, volumes in records:
+        if not np.any(volumes):
+            continue
+        yield name, DVH(doses, volumes, max_at_zero_vol)
+
+
+def iter_text(text, fmt="auto", max_at_zero_vol=False):
+    """Yield (structure name, DVH) for each structure with non zero volume
+    in the text of an export.
+    """
+
+    for record in iter_dvhs(iter_records(text, fmt), max_at_zero_vol):
+        yield record
+
+
+def read_text(path, encoding="utf-8"):
+    with io.open(path, "r", encoding=encoding, errors="replace") as f:
+        return f.read()
+
+
+def iter_file(path, fmt="auto", max_at_zero_vol=False, encoding="utf-8"):
+    """Yield (structure name, DVH) for each structure in the export file at path"""
+
+    for record in iter_text(read_text(path, encoding), fmt, max_at_zero_vol):
+        yield record
+
+
+def iter_directory(directory, pattern="*.txt", fmt="auto", max_at_zero_vol=False, encoding="utf-8"):
+    """Yield (path, structure name, DVH) for every structure in each export
+    file matching pattern in directory. Files are read one at a time.
+    """
+
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        for name, dvh in iter_file(path, fmt, max_at_zero_vol, encoding):
+            yield path, name, dvh
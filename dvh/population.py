@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from .collection import as_collection
+
+
+def common_dose_grid(dvhs, bin_width):
+    """Return a dose grid from 0 to the largest max dose of dvhs (a
+    DVHCollection or iterable of DVHs) with a spacing of bin_width.
+    """
+
+    collection = as_collection(dvhs)
+    top = collection.max_dose.max() if len(collection) else 0.
+    return np.arange(0, top + bin_width, bin_width)
+
+
+def resample(dvhs, dose_grid):
+    """Return a 2D array where row i is the cumulative volume fraction of
+    dvhs[i] receiving each dose of dose_grid.
+
+    dvhs may be a DVHCollection or an iterable of DVHs and all curves are
+    resampled together in one vectorized pass.
+    """
+
+    return as_collection(dvhs).volume_fraction_receiving_dose(np.asarray(dose_grid, dtype=np.float64))
+
+
+def population_mean(dvhs, dose_grid):
+    """Return the mean cumulative volume fraction of dvhs at each dose of dose_grid"""
+    return resample(dvhs, dose_grid).mean(axis=0)
+
+
+def population_std(dvhs, dose_grid, ddof=0):
+    """Return the standard deviation of the cumulative volume fraction of
+    dvhs at each dose of dose_grid.
+    """
+    return resample(dvhs, dose_grid).std(axis=0, ddof=ddof)
+
+
+def population_percentiles(dvhs, dose_grid, percentiles=(5, 50, 95)):
+    """Return an array of shape (len(percentiles), len(dose_grid)) of the
+    percentile envelopes of the cumulative volume fractions of dvhs.
+    """
+    return np.percentile(resample(dvhs, dose_grid), percentiles, axis=0)
+
+
+def population_median(dvhs, dose_grid):
+    """Return the median cumulative volume fraction of dvhs at each dose of dose_grid"""
+    return np.median(resample(dvhs, dose_grid), axis=0)
+
+
+def population_bands(dvhs, dose_grid, percentiles=(5, 25, 50, 75, 95)):
+    """Return a dictionary of population DVH statistics like:
+        {
+            "doses": dose_grid,
+            "mean": [...],
+            "std": [...],
+            "percentiles": {5: [...], 25: [...], ...},
+        }
+    computed from a single resampling of dvhs onto dose_grid.
+    """
+
+    dose_grid = np.asarray(dose_grid, dtype=np.float64)
+    volumes = resample(dvhs, dose_grid)
+    envelopes = np.percentile(volumes, percentiles, axis=0)
+
+    return {
+        "doses": dose_grid,
+        "mean": volumes.mean(axis=0),
+        "std": volumes.std(axis=0),
+        "percentiles": dict(zip(percentiles, envelopes)),
+    }
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Radiobiological models evaluated from the differential volumes of DVHs.
+
+Every function accepts a single DVH, an iterable of DVHs or a DVHCollection
+along with arrays of model parameters. Parameters are broadcast together and
+the result has shape (number of DVHs,) + parameter shape (or just the
+parameter shape for a single DVH) so parameter sweeps over whole cohorts
+run as blocked, broadcasted NumPy operations.
+"""
+
+import math
+
+import numpy as np
+
+from .dvh import DVH
+from .collection import BLOCK_ELEMENTS, as_collection
+
+try:
+    from scipy.special import ndtr as _normal_cdf
+except ImportError:
+    _erf = np.vectorize(math.erf, otypes=[np.float64])
+
+    def _normal_cdf(x):
+        return 0.5*(1 + _erf(np.asarray(x)/math.sqrt(2)))
+
+
+def _nonzero_bins(collection):
+    """Return the doses and differential volumes of all bins with non zero
+    volume along with the start of each member in the reduced arrays.
+    """
+
+    nonzero = collection.diff_volumes > 0
+    counts = np.add.reduceat(nonzero.astype(np.intp), collection.starts)
+    starts = np.zeros(len(counts), dtype=np.intp)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return collection.doses[nonzero], collection.diff_volumes[nonzero], starts
+
+
+def _segment_sums(dvhs, params, terms):
+    """Return sums where sums[i, k] is the sum over the dose bins of member
+    i of terms(doses, volumes, params[k]) and params is a sequence of
+    equally shaped parameter arrays. At most BLOCK_ELEMENTS (parameter, dose
+    bin) terms are held in memory at once.
+    """
+
+    collection = as_collection(dvhs)
+    doses, volumes, starts = _nonzero_bins(collection)
+
+    n_params = len(params[0])
+    sums = np.empty((len(collection), n_params))
+    step = max(1, BLOCK_ELEMENTS//max(len(doses), 1))
+
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        for block in range(0, n_params, step):
+            chunk = [p[block:block + step, None] for p in params]
+            sums[:, block:block + step] = np.add.reduceat(terms(doses, volumes, *chunk), starts, axis=1).T
+
+    return sums
+
+
+def _broadcast(*params):
+    arrays = np.broadcast_arrays(*[np.asarray(p, dtype=np.float64) for p in params])
+    return arrays[0].shape, [a.ravel() for a in arrays]
+
+
+def _reshape(dvhs, values, shape):
+    if isinstance(dvhs, DVH):
+        return values[0].reshape(shape)[()]
+    return values.reshape((len(values),) + shape)
+
+
+def _geud_terms(doses, volumes, a):
+    if not (a == 0).any():
+        return volumes*doses**a
+    # a == 0 is the limit exp(sum(v*ln(D))) handled by summing logs
+    return np.where(a == 0, volumes*np.log(doses), volumes*doses**a)
+
+
+def _geud(dvhs, a):
+    sums = _segment_sums(dvhs, [a], _geud_terms)
+    with np.errstate(divide="ignore", over="ignore"):
+        return np.where(a == 0, np.exp(sums), sums**(1./np.where(a == 0, 1, a)))
+
+
+def geud(dvhs, a):
+    """Return the generalized equivalent uniform dose (sum(v_i*D_i^a))^(1/a)
+    for each DVH and value of the volume parameter a.
+    """
+
+    shape, (a,) = _broadcast(a)
+    return _reshape(dvhs, _geud(dvhs, a), shape)
+
+
+def lkb_ntcp(dvhs, td50, m, n):
+    """Return the Lyman-Kutcher-Burman normal tissue complication
+    probability Phi((gEUD(1/n) - TD50)/(m*TD50)) for each DVH and set of
+    (broadcast) td50, m & n parameters. td50 is in the DVH dose units.
+    """
+
+    shape, (td50, m, n) = _broadcast(td50, m, n)
+    t = (_geud(dvhs, 1./n) - td50)/(m*td50)
+    return _reshape(dvhs, _normal_cdf(t), shape)
+
+
+def _tcp_terms(doses, volumes, d50, gamma50):
+    return volumes*np.exp(2*gamma50/math.log(2)*(1 - doses/d50))
+
+
+def poisson_tcp(dvhs, d50, gamma50):
+    """Return the Poisson tumour control probability
+    prod_i (1/2)^(v_i*exp(2*gamma50/ln(2)*(1 - D_i/D50))) for each DVH and
+    set of (broadcast) d50 & gamma50 parameters. d50 is in the DVH dose units.
+    """
+
+    shape, (d50, gamma50) = _broadcast(d50, gamma50)
+    sums = _segment_sums(dvhs, [d50, gamma50], _tcp_terms)
+    return _reshape(dvhs, np.exp(-math.log(2)*sums), shape)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import struct
+import zlib
+
+import numpy as np
+
+from .population import resample
+
+
+# magic, version, number of dose grid points, histogram resolution, count
+SUMMARY_MAGIC = b"DVHS"
+SUMMARY_VERSION = 1
+SUMMARY_HEADER = struct.Struct("<4sB3xIIQ")
+
+
+class DVHSummary(object):
+    """A mergeable summary of a population of DVHs on a fixed dose grid.
+
+    For every dose of dose_grid the summary holds the number of DVHs, the
+    sum and sum of squares of their cumulative volume fractions and a
+    histogram of the volume fractions with `resolution` equal width buckets
+    on [0, 1] used as a quantile sketch.
+
+    Merging summaries only adds these arrays so it is associative and
+    merging partial summaries gives the same counts and histograms as a
+    single summary of all DVHs (sums and sums of squares match to floating
+    point rounding). Percentiles are returned as bucket centres so they are
+    within 0.5/resolution of the nearest rank percentile of the population.
+    """
+
+    def __init__(self, dose_grid, resolution=1000):
+        if resolution < 1:
+            raise ValueError("resolution must be at least 1")
+
+        self.dose_grid = np.asarray(dose_grid, dtype=np.float64)
+        self.resolution = int(resolution)
+        self.count = 0
+        self.sums = np.zeros(len(self.dose_grid))
+        self.sums_sq = np.zeros(len(self.dose_grid))
+        self.histograms = np.zeros((len(self.dose_grid), self.resolution), dtype=np.int64)
+
+    @classmethod
+    def from_dvhs(cls, dvhs, dose_grid, resolution=1000):
+        """Create a summary of dvhs (a DVHCollection or iterable of DVHs)"""
+        return cls(dose_grid, resolution).add(dvhs)
+
+    def add(self, dvhs):
+        """Add dvhs (a DVHCollection or iterable of DVHs) to the summary"""
+
+        volumes = resample(dvhs, self.dose_grid)
+        if not len(volumes):
+            return self
+
+        n_doses, res = len(self.dose_grid), self.resolution
+
+        self.count += len(volumes)
+        self.sums += volumes.sum(axis=0)
+        self.sums_sq += (volumes**2).sum(axis=0)
+
+        buckets = np.clip((volumes*res).astype(np.intp), 0, res - 1)
+        buckets += np.arange(n_doses)*res
+        self.histograms += np.bincount(buckets.ravel(), minlength=n_doses*res).reshape(n_doses, res)
+
+        return self
+
+    def _check_compatible(self, other):
+        if self.resolution != other.resolution or not np.array_equal(self.dose_grid, other.dose_grid):
+            raise ValueError("Can only merge summaries with the same dose grid and resolution")
+
+    def merge(self, other):
+        """Add the contents of other to this summary"""
+
+        self._check_compatible(other)
+        self.count += other.count
+        self.sums += other.sums
+        self.sums_sq += other.sums_sq
+        self.histograms += other.histograms
+
+        return self
+
+    def __add__(self, other):
+        self._check_compatible(other)
+        merged = DVHSummary(self.dose_grid, self.resolution)
+        return merged.merge(self).merge(other)
+
+    def mean(self):
+        """Return the population mean volume fraction at each dose"""
+        return self.sums/self.count
+
+    def std(self):
+        """Return the population standard deviation at each dose"""
+        mean = self.mean()
+        return np.sqrt(np.maximum(self.sums_sq/self.count - mean**2, 0))
+
+    def percentile(self, q):
+        """Return the q'th percentile volume fraction at each dose. If q is a
+        sequence the result has shape (len(q), len(dose_grid)).
+        """
+
+        q = np.asarray(q, dtype=np.float64)
+        if np.any((q < 0) | (q > 100)):
+            raise ValueError("Percentiles must be in the range [0, 100]")
+
+        if not self.count:
+            raise ValueError("Can not calculate percentiles of an empty summary")
+
+        n_doses, res = len(self.dose_grid), self.resolution
+
+        # nearest rank of each percentile
+        ranks = np.clip(np.ceil(q.reshape(-1)/100.*self.count), 1, self.count)
+
+        # offset each row of cumulative counts so the flattened array is
+        # sorted and every row can be searched at once
+        row_offsets = np.arange(n_doses)*(self.count + 1)
+        cum = (np.cumsum(self.histograms, axis=1) + row_offsets[:, None]).ravel()
+        targets = ranks[:, None] + row_offsets[None, :]
+        buckets = np.searchsorted(cum, targets, side="left") - np.arange(n_doses)*res
+
+        return ((buckets + 0.5)/res).reshape(q.shape + (n_doses,))
+
+    def to_bytes(self):
+        """Return a compact binary representation of the summary"""
+
+        header = SUMMARY_HEADER.pack(SUMMARY_MAGIC, SUMMARY_VERSION, len(self.dose_grid), self.resolution, self.count)
+        histograms = zlib.compress(self.histograms.astype("<i8").tobytes())
+        arrays = b"".join(a.astype("<f8").tobytes() for a in (self.dose_grid, self.sums, self.sums_sq))
+
+        return header + arrays + histograms
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a summary from the output of summary.to_bytes()"""
+
+        if len(data) < SUMMARY_HEADER.size:
+            raise ValueError("Summary data is truncated")
+
+        magic, version, n_doses, resolution, count = SUMMARY_HEADER.unpack_from(data)
+        if magic != SUMMARY_MAGIC:
+            raise ValueError("Data is not a serialized DVH summary")
+        if version != SUMMARY_VERSION:
+            raise ValueError("Unsupported DVH summary version {0}".format(version))
+
+        offset = SUMMARY_HEADER.size
+        arrays = []
+        for _ in range(3):
+            arrays.append(np.frombuffer(data, dtype="<f8", count=n_doses, offset=offset).astype(np.float64))
+            offset += 8*n_doses
+
+        summary = cls(arrays[0], resolution)
+        summary.count = count
+        summary.sums, summary.sums_sq = arrays[1], arrays[2]
+        histograms = np.frombuffer(zlib.decompress(data[offset:]), dtype="<i8")
+        summary.histograms = histograms.astype(np.int64).reshape(n_doses, resolution)
+
+        return summary
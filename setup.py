@@ -33,9 +33,15 @@ setup(
     package_dir={'dvh':
                  'dvh'},
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'dvh-metrics = dvh.cli:main',
+        ],
+    },
     install_requires=[
         'numpy',
     ],
+    python_requires='>=3.7',
     license="BSD",
     zip_safe=False,
     keywords='dvh',
@@ -44,11 +50,13 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
-        "Programming Language :: Python :: 2",
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
     test_suite='tests',
 )
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_accumulator
+----------------------------------
+
+Tests for `dvh.accumulator` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH, DVHAccumulator
+
+
+class TestDVHAccumulator(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(3)
+        self.dose = (rng.rand(10, 12, 12)*50).astype(np.float32)
+        self.mask = np.ones(self.dose.shape, dtype=bool)
+        self.expected = DVH.from_dose_grid(self.dose, self.mask, 0.125, 0.5)
+
+    def assertDVHClose(self, dvh, expected):
+        np.testing.assert_array_equal(dvh.doses, expected.doses)
+        np.testing.assert_allclose(dvh.cum_volumes, expected.cum_volumes)
+        self.assertAlmostEqual(dvh.mean_dose, expected.mean_dose)
+
+    def test_chunked_updates(self):
+        acc = DVHAccumulator(0.5)
+        for chunk in np.array_split(self.dose.ravel(), 7):
+            acc.update(chunk, 0.125)
+        self.assertDVHClose(acc.to_dvh(), self.expected)
+        self.assertAlmostEqual(acc.total_volume, self.dose.size*0.125)
+
+    def test_weighted_updates(self):
+        acc = DVHAccumulator(0.5)
+        acc.update(self.dose.ravel(), np.full(self.dose.size, 0.125))
+        self.assertDVHClose(acc.to_dvh(), self.expected)
+
+    def test_merge(self):
+        flat = self.dose.ravel()
+        a = DVHAccumulator(0.5).update(flat[:500], 0.125)
+        b = DVHAccumulator(0.5).update(flat[500:], 0.125)
+        self.assertDVHClose((a + b).to_dvh(), self.expected)
+        self.assertDVHClose(a.merge(b).to_dvh(), self.expected)
+
+    def test_merge_mismatched_bins(self):
+        with self.assertRaises(ValueError):
+            DVHAccumulator(0.5).merge(DVHAccumulator(1.))
+
+    def test_snapshot(self):
+        acc = DVHAccumulator(1.)
+        acc.update([0.5, 1.5, 1.7])
+        first = acc.to_dvh()
+        acc.update([10.2])
+        self.assertEqual(first.max_dose, 1.5)
+        self.assertEqual(acc.to_dvh().max_dose, 10.5)
+        self.assertEqual(len(acc), 11)
+
+    def test_mismatched_volumes(self):
+        with self.assertRaises(ValueError):
+            DVHAccumulator(1.).update([1, 2, 3], [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
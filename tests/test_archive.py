@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_archive
+----------------------------------
+
+Tests for `dvh.archive` module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest2 as unittest
+import numpy as np
+from dvh import archive as archive_module
+from dvh import DVH, DVHArchive, DVHArchiveWriter, write_archive
+
+
+class TestDVHArchive(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cohort.dvha")
+
+        test_doses = np.arange(0, 370, 10)
+        test_diff_vols = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 4, 2, 1, 0, 0, 0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 60, 50, 40, 30, 20, 10, 0, 0]
+
+        self.items = [
+            (("pt1", "plan1", "PTV"), DVH(test_doses, test_diff_vols)),
+            (("pt1", "plan1", "Cord"), DVH([1, 2, 3, 4], [30, 30, 10, 5], max_at_zero_vol=True)),
+            (("pt2", "plan1", "PTV"), DVH([0, 5, 15, 25, 35], [10, 10, 5, 2, 0])),
+        ]
+        write_archive(self.path, self.items)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertDVHEqual(self, dvh, other):
+        np.testing.assert_array_equal(dvh.doses, other.doses)
+        np.testing.assert_array_equal(dvh.cum_volumes, other.cum_volumes)
+        np.testing.assert_array_equal(dvh.diff_volumes, other.diff_volumes)
+        self.assertEqual(dvh.mean_dose, other.mean_dose)
+        self.assertEqual(dvh.min_dose, other.min_dose)
+        self.assertEqual(dvh.max_dose, other.max_dose)
+        self.assertEqual(dvh.max_at_zero_vol, other.max_at_zero_vol)
+
+    def test_round_trip(self):
+        with DVHArchive(self.path) as archive:
+            self.assertEqual(len(archive), len(self.items))
+            self.assertEqual(archive.keys(), [k for k, _ in self.items])
+            for (key, dvh), stored in zip(self.items, archive):
+                self.assertDVHEqual(dvh, stored)
+
+    def test_get(self):
+        archive = DVHArchive(self.path)
+        self.assertDVHEqual(self.items[1][1], archive.get("pt1", "plan1", "Cord"))
+        self.assertDVHEqual(self.items[2][1], archive[("pt2", "plan1", "PTV")])
+        self.assertIn(("pt2", "plan1", "PTV"), archive)
+        with self.assertRaises(KeyError):
+            archive.get("pt3", "plan1", "PTV")
+
+    def test_memory_mapped(self):
+        archive = DVHArchive(self.path)
+        dvh = archive[0]
+        self.assertIsInstance(dvh.doses, np.memmap)
+        self.assertFalse(dvh.doses.flags.writeable)
+
+    def test_stats(self):
+        archive = DVHArchive(self.path)
+        np.testing.assert_array_equal(archive.mean_dose, [d.mean_dose for _, d in self.items])
+        np.testing.assert_array_equal(archive.max_dose, [d.max_dose for _, d in self.items])
+
+    def test_query(self):
+        archive = DVHArchive(self.path)
+        self.assertEqual(archive.find(structure="PTV"), [0, 2])
+        self.assertEqual([k for k, _ in archive.query(patient="pt1")], [k for k, _ in self.items[:2]])
+
+    def test_keyed_lookup_is_lazy(self):
+        archive = DVHArchive(self.path)
+        self.assertDVHEqual(self.items[2][1], archive.get("pt2", "plan1", "PTV"))
+        self.assertNotIn(("pt2", "plan2", "PTV"), archive)
+        self.assertEqual(archive.find(patient="pt1", structure="Cord"), [1])
+        self.assertEqual(archive.key(1), ("pt1", "plan1", "Cord"))
+        # no lookup above needed the names of every curve
+        self.assertIsNone(archive._keys)
+
+    def test_hash_collisions(self):
+        path = os.path.join(self.tmpdir, "collisions.dvha")
+        original = archive_module._hash
+        archive_module._hash = lambda value: 7
+        try:
+            write_archive(path, self.items)
+            archive = DVHArchive(path)
+            for (patient, plan, structure), dvh in self.items:
+                self.assertDVHEqual(dvh, archive.get(patient, plan, structure))
+            self.assertEqual(archive.find(structure="PTV"), [0, 2])
+            with self.assertRaises(KeyError):
+                archive.get("pt3", "plan1", "PTV")
+        finally:
+            archive_module._hash = original
+
+    def test_empty(self):
+        path = os.path.join(self.tmpdir, "empty.dvha")
+        with DVHArchiveWriter(path):
+            pass
+        archive = DVHArchive(path)
+        self.assertEqual(len(archive), 0)
+        self.assertEqual(archive.keys(), [])
+        self.assertEqual(archive.find(structure="PTV"), [])
+        self.assertNotIn(("pt1", "plan1", "PTV"), archive)
+
+    def test_invalid_file(self):
+        path = os.path.join(self.tmpdir, "invalid.dvha")
+        with open(path, "wb") as f:
+            f.write(b"0" * 100)
+        with self.assertRaises(ValueError):
+            DVHArchive(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cli
+----------------------------------
+
+Tests for `dvh.cli` module.
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh import cli
+
+
+MONACO = """Ant Scalene\t0\t8.155
+Ant Scalene\t100\t8.155
+Ant Scalene\t200\t4.0
+Ant Scalene\t300\t0
+PTV 1\t0\t503.55
+PTV 1\t100\t503.55
+PTV 1\t200\t251.7
+PTV 1\t300\t0
+"""
+
+
+class TestCLI(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "out")
+        os.mkdir(os.path.join(self.directory, "in"))
+
+        self.dvh = DVH(np.arange(0, 370, 10), np.linspace(10, 0, 37))
+        self.write("plan1.txt", MONACO)
+        self.write("cord.json", self.dvh.serialize("json"))
+        self.write("cord.dvhb", self.dvh.serialize("binary"), "wb")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data, mode="w"):
+        with open(os.path.join(self.directory, "in", name), mode) as f:
+            f.write(data)
+
+    def run_cli(self, *args):
+        return cli.main([os.path.join(self.directory, "in"), "-o", self.output, "-j", "1"] + list(args))
+
+    def test_csv(self):
+        self.assertEqual(self.run_cli("-m", "D50%,V100,mean"), 0)
+        with io.open(self.output) as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], ["file", "structure", "D50%", "V100", "mean"])
+        by_structure = dict((r[1], r) for r in rows[1:])
+        self.assertEqual(sorted(by_structure), ["Ant Scalene", "PTV 1", "cord"])
+        self.assertAlmostEqual(float(by_structure["cord"][2]), self.dvh.dose_to_volume_fraction(0.5))
+        self.assertAlmostEqual(float(by_structure["cord"][4]), self.dvh.mean_dose)
+
+    def test_jsonl_pool(self):
+        status = self.run_cli("-m", "max", "-f", "jsonl", "-j", "2", "--chunksize", "1", "-p", "cord.*")
+        self.assertEqual(status, 0)
+        with open(self.output) as f:
+            rows = [json.loads(line) for line in f]
+
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            self.assertEqual(row["metrics"]["max"], self.dvh.max_dose)
+
+    def test_bad_file(self):
+        self.write("broken.json", "{")
+        self.assertEqual(self.run_cli("-m", "mean"), 1)
+
+    def test_bad_metric(self):
+        self.assertEqual(self.run_cli("-m", "Q10"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
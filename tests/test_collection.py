@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_collection
+----------------------------------
+
+Tests for `dvh.collection` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH, DVHCollection
+
+
+class TestDVHCollection(unittest.TestCase):
+
+    def setUp(self):
+
+        self.test_doses = np.arange(0, 370, 10)
+        self.test_diff_vols = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 4, 2, 1, 0, 0, 0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 60, 50, 40, 30, 20, 10, 0, 0]
+        self.test_cum_vols = [518, 518, 518, 518, 518, 518, 518, 518, 518, 517, 515, 512, 508, 503, 497, 493, 491, 490, 490, 490, 490, 490, 490, 480, 460, 430, 390, 340, 280, 210, 150, 100, 60, 30, 10, 0, 0.]
+
+        self.dvhs = [
+            DVH(self.test_doses, self.test_cum_vols),
+            DVH(self.test_doses, self.test_diff_vols, max_at_zero_vol=True),
+            DVH([1, 2, 3, 4], [30, 30, 10, 5]),
+            DVH([0, 5, 15, 25, 35], [10, 10, 5, 2, 0]),
+        ]
+        self.collection = DVHCollection.from_dvhs(self.dvhs)
+
+    def test_len(self):
+        self.assertEqual(len(self.collection), len(self.dvhs))
+        self.assertEqual(self.collection.offsets[-1], sum(len(d.doses) for d in self.dvhs))
+
+    def test_getitem(self):
+        for dvh, member in zip(self.dvhs, self.collection):
+            np.testing.assert_array_equal(dvh.doses, member.doses)
+            np.testing.assert_array_equal(dvh.cum_volumes, member.cum_volumes)
+            self.assertEqual(dvh.max_at_zero_vol, member.max_at_zero_vol)
+
+    def test_getitem_views(self):
+        member = self.collection[1]
+        self.assertTrue(np.shares_memory(member.doses, self.collection.doses))
+        self.assertEqual(member.mean_dose, self.dvhs[1].mean_dose)
+
+    def test_getitem_out_of_range(self):
+        with self.assertRaises(IndexError):
+            self.collection[len(self.dvhs)]
+
+    def test_stats(self):
+        np.testing.assert_allclose(self.collection.mean_dose, [d.mean_dose for d in self.dvhs])
+        np.testing.assert_array_equal(self.collection.min_dose, [d.min_dose for d in self.dvhs])
+        np.testing.assert_array_equal(self.collection.max_dose, [d.max_dose for d in self.dvhs])
+
+    def test_member_stats_kept(self):
+        data = self.dvhs[0].to_dict()
+        data["min_dose"], data["max_dose"], data["mean_dose"] = 1., 2., 3.
+        dvh = DVH.from_dict(data)
+        collection = DVHCollection.from_dvhs([dvh, self.dvhs[1]])
+        self.assertEqual(collection.min_dose[0], 1.)
+        self.assertEqual(collection.max_dose[0], 2.)
+        self.assertEqual(collection.mean_dose.tolist(), [3., self.dvhs[1].mean_dose])
+        self.assertEqual(collection[0].mean_dose, 3.)
+
+    def test_diff_volumes(self):
+        expected = np.concatenate([d.diff_volumes for d in self.dvhs])
+        np.testing.assert_array_equal(self.collection.diff_volumes, expected)
+
+    def test_dose_to_volume_fraction(self):
+        fractions = np.array([0, 0.02, 0.5, 0.95, 0.9999999999, 1])
+        doses = self.collection.dose_to_volume_fraction(fractions)
+        self.assertEqual(doses.shape, (len(self.dvhs), len(fractions)))
+        for dvh, row in zip(self.dvhs, doses):
+            np.testing.assert_array_equal(row, dvh.dose_to_volume_fraction(fractions))
+
+    def test_dose_to_volume_fraction_scalar(self):
+        doses = self.collection.dose_to_volume_fraction(0.5)
+        np.testing.assert_array_equal(doses, [d.dose_to_volume_fraction(0.5) for d in self.dvhs])
+
+    def test_dose_to_volume_fraction_invalid(self):
+        with self.assertRaises(ValueError):
+            self.collection.dose_to_volume_fraction([0.5, -0.1])
+
+    def test_volume_fraction_receiving_dose(self):
+        doses = np.array([0, 2.5, 80, 100, 215.5, 340, 400])
+        volumes = self.collection.volume_fraction_receiving_dose(doses)
+        self.assertEqual(volumes.shape, (len(self.dvhs), len(doses)))
+        for dvh, row in zip(self.dvhs, volumes):
+            np.testing.assert_array_equal(row, dvh.volume_fraction_receiving_dose(doses))
+
+    def test_from_arrays(self):
+        collection = DVHCollection.from_arrays(
+            [self.test_doses, [1, 2, 3, 4]],
+            [self.test_diff_vols, [30, 30, 10, 5]],
+        )
+        self.assertEqual(len(collection), 2)
+        np.testing.assert_allclose(collection.mean_dose, [self.dvhs[1].mean_dose, self.dvhs[2].mean_dose])
+
+    def test_invalid_offsets(self):
+        with self.assertRaises(ValueError):
+            DVHCollection([0, 1, 2, 3], [1, 1, 0.5, 0], [0, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compare
+----------------------------------
+
+Tests for `dvh.compare` module.
+"""
+
+import tracemalloc
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh import compare
+
+
+class TestCompare(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(7)
+        doses = np.arange(0, 370, 10)
+        self.reference = [DVH(doses*s, np.sort(rng.rand(len(doses)))[::-1]) for s in (1, 1.1, 1.2)]
+        self.candidates = [DVH(doses*s, np.sort(rng.rand(len(doses)))[::-1]) for s in (0.9, 1, 1.05, 1.3)]
+        self.dose_grid = np.arange(0, 500, 5.)
+
+    def test_distance_matrices(self):
+        area, max_difference = compare.distance_matrices(self.reference, self.candidates, self.dose_grid)
+        self.assertEqual(area.shape, (3, 4))
+
+        for i, ref in enumerate(self.reference):
+            for j, cand in enumerate(self.candidates):
+                diff = np.abs(ref.volume_fraction_receiving_dose(self.dose_grid) - cand.volume_fraction_receiving_dose(self.dose_grid))
+                self.assertAlmostEqual(area[i, j], np.trapz(diff, self.dose_grid))
+                self.assertAlmostEqual(max_difference[i, j], diff.max())
+
+    def test_small_blocks(self):
+        expected = compare.distance_matrices(self.reference, self.candidates, self.dose_grid)
+
+        block_elements = compare.BLOCK_ELEMENTS
+        compare.BLOCK_ELEMENTS = 2*len(self.dose_grid)
+        try:
+            blocks = list(compare.iter_distance_blocks(self.reference, self.candidates, self.dose_grid))
+            out = (np.zeros((3, 4)), np.zeros((3, 4)))
+            compare.distance_matrices(self.reference, self.candidates, self.dose_grid, out=out)
+        finally:
+            compare.BLOCK_ELEMENTS = block_elements
+
+        self.assertGreater(len(blocks), 1)
+        np.testing.assert_allclose(out[0], expected[0])
+        np.testing.assert_allclose(out[1], expected[1])
+
+    def test_candidates_resampled_in_blocks(self):
+        rng = np.random.RandomState(3)
+        doses = np.arange(0, 370, 10)
+        candidates = [DVH(doses, np.sort(rng.rand(len(doses)))[::-1]) for _ in range(2000)]
+        dose_grid = np.arange(0, 400, 0.5)
+
+        block_elements = compare.BLOCK_ELEMENTS
+        compare.BLOCK_ELEMENTS = 2**16
+        tracemalloc.start()
+        try:
+            next(compare.iter_distance_blocks(self.reference[:1], candidates, dose_grid))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            compare.BLOCK_ELEMENTS = block_elements
+
+        # the resampled candidates plus the temporaries of one block
+        self.assertLess(peak, 2*2000*len(dose_grid)*8)
+
+    def test_metric_differences(self):
+        diffs = compare.metric_differences(self.reference, self.candidates, ["D50%", "V100", "mean"])
+        self.assertEqual(diffs.shape, (3, 3, 4))
+        self.assertAlmostEqual(
+            diffs[0, 2, 1],
+            self.reference[2].dose_to_volume_fraction(0.5) - self.candidates[1].dose_to_volume_fraction(0.5),
+        )
+        self.assertAlmostEqual(diffs[2, 0, 3], self.reference[0].mean_dose - self.candidates[3].mean_dose)
+
+
+if __name__ == '__main__':
+    unittest.main()
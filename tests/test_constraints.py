@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_constraints
+----------------------------------
+
+Tests for `dvh.constraints` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh.constraints import Constraint, Metric, compile_constraints
+
+
+class TestMetric(unittest.TestCase):
+
+    def test_parse_dose_to_volume(self):
+        self.assertEqual(Metric.parse("D95%"), Metric("D", 0.95))
+        self.assertEqual(Metric.parse("d2"), Metric("D", 0.02))
+
+    def test_parse_volume_receiving_dose(self):
+        self.assertEqual(Metric.parse("V20Gy"), Metric("V", 2000.))
+        self.assertEqual(Metric.parse("V20Gy", dose_units="Gy"), Metric("V", 20.))
+        self.assertEqual(Metric.parse("V1500"), Metric("V", 1500.))
+
+    def test_parse_stats(self):
+        self.assertEqual(Metric.parse("Mean"), Metric("mean"))
+        self.assertEqual(Metric.parse(" max "), Metric("max"))
+
+    def test_parse_invalid(self):
+        for text in ["D150%", "Dmean", "V20%", "D95Gy", "V20mGy", ""]:
+            with self.assertRaises(ValueError):
+                Metric.parse(text)
+
+
+class TestConstraints(unittest.TestCase):
+
+    def setUp(self):
+
+        doses = np.arange(0, 370, 10)
+        diff_vols = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 4, 2, 1, 0, 0, 0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 60, 50, 40, 30, 20, 10, 0, 0]
+
+        self.ptv = DVH(doses, diff_vols)
+        self.cord = DVH([1, 2, 3, 4], [30, 30, 10, 5])
+        self.plans = {
+            "plan1": {"PTV": self.ptv, "Cord": self.cord},
+            "plan2": {"PTV": DVH(doses*1.1, diff_vols)},
+        }
+
+    def test_parse(self):
+        constraint = Constraint.parse("Cord", "max < 45Gy")
+        self.assertEqual(constraint.metric, Metric("max"))
+        self.assertEqual(constraint.threshold, 4500.)
+
+        constraint = Constraint.parse("Lung", "V20Gy <= 30%")
+        self.assertEqual(constraint.metric, Metric("V", 2000.))
+        self.assertEqual(constraint.threshold, 0.3)
+
+    def test_default_name(self):
+        d95 = Constraint("PTV", Metric("D", 0.95), ">=", 4750)
+        d98 = Constraint("PTV", Metric("D", 0.98), ">=", 4750)
+        self.assertEqual(d95.name, "PTV D95% >= 4750")
+        self.assertEqual(d98.name, "PTV D98% >= 4750")
+        self.assertEqual(Constraint("Lung", Metric("V", 2000.), "<", 0.3).name, "Lung V2000 < 30%")
+        self.assertEqual(Constraint("Cord", Metric("max"), "<", 4500).name, "Cord max < 4500")
+
+    def test_parse_invalid(self):
+        with self.assertRaises(ValueError):
+            Constraint.parse("Cord", "max = 45Gy")
+        with self.assertRaises(ValueError):
+            Constraint.parse("Cord", "max < 45%")
+
+    def test_parse_volume_threshold_range(self):
+        self.assertEqual(Constraint.parse("Rectum", "V20Gy < 0.3").threshold, 0.3)
+        for text in ["V20Gy < 30", "V20Gy < 130%"]:
+            with self.assertRaises(ValueError):
+                Constraint.parse("Rectum", text)
+
+    def test_evaluate(self):
+        compiled = compile_constraints([
+            ("PTV", "D95% >= 200"),
+            ("PTV", "V300 < 0.25"),
+            ("PTV", "mean > 250"),
+            ("Cord", "max <= 4"),
+            ("Cord", "D50% < 2"),
+        ])
+        results = compiled.evaluate(self.plans)
+
+        self.assertEqual(results.values.shape, (2, 5))
+        row = results.plans.index("plan1")
+        expected = [
+            self.ptv.dose_to_volume_fraction(0.95),
+            self.ptv.volume_fraction_receiving_dose(300),
+            self.ptv.mean_dose,
+            self.cord.max_dose,
+            self.cord.dose_to_volume_fraction(0.5),
+        ]
+        np.testing.assert_allclose(results.values[row], expected)
+        passed = [expected[0] >= 200, expected[1] < 0.25, expected[2] > 250, expected[3] <= 4, expected[4] < 2]
+        np.testing.assert_array_equal(results.passed[row], passed)
+        self.assertAlmostEqual(results.margin[row, 2], self.ptv.mean_dose - 250)
+        self.assertAlmostEqual(results.margin[row, 3], 0)
+
+    def test_missing_structure(self):
+        compiled = compile_constraints([("Cord", "max < 45Gy")])
+        results = compiled.evaluate(self.plans)
+        row = results.plans.index("plan2")
+        self.assertTrue(np.isnan(results.values[row, 0]))
+        self.assertFalse(results.passed[row, 0])
+        self.assertEqual([r["plan"] for r in results.failures()], ["plan2"])
+
+    def test_rows(self):
+        compiled = compile_constraints([("PTV", "mean > 250"), ("Cord", "max < 45Gy")])
+        rows = list(compiled.evaluate([self.plans["plan1"]]).rows())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]["constraint"], "Cord max < 45Gy")
+        self.assertTrue(all(r["passed"] for r in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,7 @@ Tests for `dvh` module.
 import json
 import unittest2 as unittest
 import numpy as np
-from dvh import DVH, monotonic_increasing, monotonic_decreasing
+from dvh import DVH, DVHCollection, MetricCache, dvh_serializer, monotonic_increasing, monotonic_decreasing
 
 
 class TestDvh(unittest.TestCase):
@@ -145,6 +145,54 @@ class TestDvh(unittest.TestCase):
         dvh2 = DVH(self.test_doses, dvh.diff_volumes)
         self.assertAlmostEqual(sum(dvh2.cum_volumes - dvh.cum_volumes), 0)
 
+    def test_lazy_derived_values(self):
+        dvh = DVH(self.test_doses, self.test_diff_vols)
+        self.assertIsNone(dvh._diff_volumes)
+        self.assertIsNone(dvh._max_dose)
+        self.assertEqual(dvh.max_dose, self.max_dose)
+        self.assertIsNotNone(dvh._diff_volumes)
+        self.assertIs(dvh.diff_volumes, dvh.diff_volumes)
+
+    def test_slots(self):
+        dvh = DVH(self.test_doses, self.test_diff_vols)
+        self.assertFalse(hasattr(dvh, "__dict__"))
+        self.assertNotIn("serializers", DVH.__slots__)
+
+    def test_pickle(self):
+        import pickle
+        dvh = DVH(self.test_doses, self.test_diff_vols)
+        dvh2 = pickle.loads(pickle.dumps(dvh, protocol=2))
+        self.assertDictEqual(dvh.to_dict(), dvh2.to_dict())
+
+    def test_from_histogram(self):
+        dvh = DVH.from_histogram([0, 0, 2, 0, 6, 2, 0], 10)
+        np.testing.assert_array_equal(dvh.doses, [0, 25, 35, 45, 55, 65])
+        np.testing.assert_array_equal(dvh.cum_volumes, [1, 1, 0.8, 0.8, 0.2, 0])
+        self.assertEqual(dvh.min_dose, 25)
+        self.assertEqual(dvh.max_dose, 55)
+
+    def test_from_histogram_empty(self):
+        with self.assertRaises(ValueError):
+            DVH.from_histogram([0, 0, 0], 10)
+
+    def test_from_dose_grid(self):
+        rng = np.random.RandomState(1234)
+        dose = (rng.rand(20, 8, 9)*70).astype(np.float32)
+        mask = np.zeros(dose.shape, dtype=bool)
+        mask[3:15, 2:6, 1:8] = True
+
+        dvh = DVH.from_dose_grid(dose, mask, voxel_volume=0.008, bin_width=0.5, slab_size=4)
+
+        counts, _ = np.histogram(dose[mask].astype(np.float64), bins=np.arange(0, 70.5, 0.5))
+        expected = DVH.from_histogram(counts*0.008, 0.5)
+        np.testing.assert_array_equal(dvh.doses, expected.doses)
+        np.testing.assert_allclose(dvh.cum_volumes, expected.cum_volumes)
+        self.assertAlmostEqual(dvh.mean_dose, dose[mask].mean(), delta=0.25)
+
+    def test_from_dose_grid_shape_mismatch(self):
+        with self.assertRaises(ValueError):
+            DVH.from_dose_grid(np.zeros((4, 4, 4)), np.ones((4, 4, 3), dtype=bool), 1, 1)
+
     def test_dose_to_volume_fraction_0(self):
         dvh = DVH(self.test_doses, self.test_cum_vols)
         self.assertAlmostEqual(dvh.dose_to_volume_fraction(0), self.max_dose)
@@ -164,6 +212,19 @@ class TestDvh(unittest.TestCase):
         with self.assertRaises(ValueError):
             dvh.dose_to_volume_fraction(100)
 
+    def test_dose_to_volume_fraction_array(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        fractions = np.array([0, 0.02, 0.5, 0.95, 0.9999999999, 1])
+        expected = [dvh.dose_to_volume_fraction(f) for f in fractions]
+        doses = dvh.dose_to_volume_fraction(fractions)
+        self.assertEqual(doses.shape, fractions.shape)
+        np.testing.assert_array_equal(doses, expected)
+
+    def test_dose_to_volume_fraction_array_invalid(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        with self.assertRaises(ValueError):
+            dvh.dose_to_volume_fraction(np.array([0.5, 1.5]))
+
     def test_volume_fraction_receiving_zero_or_more_dose(self):
         dvh = DVH(self.test_doses, self.test_cum_vols)
         self.assertAlmostEqual(dvh.volume_fraction_receiving_dose(0), 1)
@@ -178,6 +239,81 @@ class TestDvh(unittest.TestCase):
         dvh = DVH(doses, volumes)
         self.assertAlmostEqual(dvh.volume_fraction_receiving_dose(dvh.mean_dose), 0.5)
 
+    def test_volume_fraction_receiving_dose_array(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        doses = np.array([0, self.min_dose, 100, 215.5, 300, self.max_dose, self.max_dose + 1])
+        expected = [dvh.volume_fraction_receiving_dose(d) for d in doses]
+        volumes = dvh.volume_fraction_receiving_dose(doses)
+        self.assertEqual(volumes.shape, doses.shape)
+        np.testing.assert_array_equal(volumes, expected)
+        self.assertEqual(volumes[0], 1.)
+        self.assertEqual(volumes[-1], 0.)
+
+    def test_cache_disabled(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        self.assertIsNone(dvh.cache)
+        dvh.dose_to_volume_fraction(0.5)
+        self.assertIsNone(dvh.cache)
+
+    def test_cache_hits(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        cache = dvh.enable_cache(maxsize=4)
+        expected = DVH(self.test_doses, self.test_cum_vols).dose_to_volume_fraction(0.95)
+
+        self.assertEqual(dvh.dose_to_volume_fraction(0.95), expected)
+        self.assertEqual(dvh.dose_to_volume_fraction(0.95), expected)
+        dvh.volume_fraction_receiving_dose(200)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        # array queries bypass the cache
+        dvh.dose_to_volume_fraction(np.array([0.5, 0.95]))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_cache_lru_eviction(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        cache = dvh.enable_cache(maxsize=2)
+        dvh.dose_to_volume_fraction(0.1)
+        dvh.dose_to_volume_fraction(0.2)
+        dvh.dose_to_volume_fraction(0.1)
+        dvh.dose_to_volume_fraction(0.3)
+        self.assertEqual(len(cache), 2)
+        dvh.dose_to_volume_fraction(0.1)
+        self.assertEqual(cache.hits, 2)
+        dvh.dose_to_volume_fraction(0.2)
+        self.assertEqual(cache.misses, 4)
+
+    def test_cache_invalidated(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        cache = dvh.enable_cache()
+        v = dvh.volume_fraction_receiving_dose(200)
+        dvh.doses = dvh.doses*2
+        self.assertNotEqual(dvh.volume_fraction_receiving_dose(200), v)
+        self.assertEqual(dvh.volume_fraction_receiving_dose(400), v)
+        self.assertEqual(cache.hits, 0)
+
+    def test_invalidate_after_in_place_edit(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh.enable_cache()
+        v = dvh.volume_fraction_receiving_dose(200)
+        d = dvh.dose_to_volume_fraction(0.5)
+        mean = dvh.mean_dose
+
+        dvh.doses *= 2
+        dvh.invalidate()
+        self.assertEqual(dvh.volume_fraction_receiving_dose(400), v)
+        self.assertNotEqual(dvh.volume_fraction_receiving_dose(200), v)
+        self.assertEqual(dvh.dose_to_volume_fraction(0.5), 2*d)
+        self.assertEqual(dvh.mean_dose, 2*mean)
+
+    def test_shared_cache(self):
+        cache = MetricCache(maxsize=8)
+        dvh1 = DVH(self.test_doses, self.test_cum_vols)
+        dvh2 = DVH(self.test_doses*2, self.test_cum_vols)
+        dvh1.enable_cache(cache=cache)
+        dvh2.enable_cache(cache=cache)
+        self.assertNotEqual(dvh1.dose_to_volume_fraction(0.5), dvh2.dose_to_volume_fraction(0.5))
+        self.assertEqual(cache.misses, 2)
+
     def test_to_dict(self):
         doses = [1, 2, 3, 4, 5]
         volumes = [1, 1, 0.5, 0.5, 0]
@@ -226,6 +362,71 @@ class TestDvh(unittest.TestCase):
         }
         self.assertDictEqual(json.loads(json.dumps(expected)), json.loads(dvh.serialize()))
 
+    def test_binary_serialize_round_trip(self):
+        dvh = DVH(self.test_doses, self.test_diff_vols, max_at_zero_vol=True)
+        data = dvh.serialize("binary")
+        self.assertIsInstance(data, bytes)
+
+        dvh2 = DVH.from_bytes(data)
+        np.testing.assert_array_equal(dvh.doses, dvh2.doses)
+        np.testing.assert_array_equal(dvh.cum_volumes, dvh2.cum_volumes)
+        np.testing.assert_array_equal(dvh.diff_volumes, dvh2.diff_volumes)
+        self.assertEqual(dvh.mean_dose, dvh2.mean_dose)
+        self.assertEqual(dvh.min_dose, dvh2.min_dose)
+        self.assertEqual(dvh.max_dose, dvh2.max_dose)
+        self.assertTrue(dvh2.max_at_zero_vol)
+
+    def test_binary_serialize_no_copy(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh2 = DVH.from_bytes(dvh.serialize("binary"))
+        self.assertFalse(dvh2.doses.flags.owndata)
+        self.assertFalse(dvh2.cum_volumes.flags.writeable)
+
+    def test_binary32_serialize_no_diff(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        data = dvh.serialize("binary32", with_diff=False)
+        self.assertLess(len(data), len(dvh.serialize("binary", with_diff=False)))
+
+        dvh2 = DVH.from_bytes(data)
+        self.assertEqual(dvh2.doses.dtype, np.dtype("<f4"))
+        np.testing.assert_allclose(dvh.diff_volumes, dvh2.diff_volumes, atol=1e-6)
+        self.assertAlmostEqual(dvh.dose_to_volume_fraction(0.5), dvh2.dose_to_volume_fraction(0.5), places=3)
+
+    def test_from_bytes_invalid(self):
+        with self.assertRaises(ValueError):
+            DVH.from_bytes(b"not a dvh")
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        with self.assertRaises(ValueError):
+            DVH.from_bytes(dvh.serialize("binary")[:-8])
+
+    def test_from_dict(self):
+        dvh = DVH(self.test_doses, self.test_diff_vols)
+        dvh2 = DVH.from_dict(dvh.to_dict())
+        self.assertDictEqual(dvh.to_dict(), dvh2.to_dict())
+        self.assertEqual(dvh.dose_to_volume_fraction(0.5), dvh2.dose_to_volume_fraction(0.5))
+
+    def test_from_dict_no_diff(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh2 = DVH.from_dict(dvh.to_dict(False), validate=True)
+        np.testing.assert_array_equal(dvh.diff_volumes, dvh2.diff_volumes)
+
+    def test_from_dict_validate(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        data = dvh.to_dict()
+        del data["mean_dose"]
+        with self.assertRaises(ValueError):
+            DVH.from_dict(data, validate=True)
+
+        data = dvh.to_dict()
+        data["cum_volumes"] = data["cum_volumes"][::-1]
+        with self.assertRaises(ValueError):
+            DVH.from_dict(data, validate=True)
+
+    def test_from_json(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh2 = DVH.from_json(dvh.serialize(), validate=True)
+        self.assertDictEqual(dvh.to_dict(), dvh2.to_dict())
+
     def test_json_serialze_invalid(self):
 
         doses = [1, 2, 3, 4, 5]
@@ -235,6 +436,144 @@ class TestDvh(unittest.TestCase):
         with self.assertRaises(TypeError):
             dvh.serialize(method="blah")
 
+    def test_custom_serializers(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        DVH.serializers["keys"] = lambda data: sorted(data)
+        DVH.serializers["points"] = dvh_serializer(lambda d, with_diff: len(d.doses))
+        try:
+            self.assertEqual(dvh.serialize("keys", with_diff=False), sorted(dvh.to_dict(with_diff=False)))
+            self.assertEqual(dvh.serialize("points"), len(dvh.doses))
+        finally:
+            del DVH.serializers["keys"], DVH.serializers["points"]
+
+    def test_float32_storage(self):
+        dvh = DVH(self.test_doses, self.test_diff_vols)
+        dvh32 = DVH(self.test_doses, self.test_diff_vols, dtype=np.float32)
+        self.assertEqual(dvh32.cum_volumes.dtype, np.float32)
+        self.assertEqual(dvh32.diff_volumes.dtype, np.float32)
+        dvh.diff_volumes
+        self.assertEqual(dvh32.nbytes*2, dvh.nbytes)
+        self.assertAlmostEqual(dvh.mean_dose, dvh32.mean_dose, places=4)
+        self.assertEqual(dvh.max_dose, dvh32.max_dose)
+        self.assertAlmostEqual(dvh.dose_to_volume_fraction(0.5), dvh32.dose_to_volume_fraction(0.5), places=4)
+        self.assertEqual(np.asarray(dvh32.volume_fraction_receiving_dose(250)).dtype, np.float64)
+
+    def test_astype(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh32 = dvh.astype(np.float32)
+        self.assertEqual(dvh32.doses.dtype, np.float32)
+        self.assertEqual(dvh32.mean_dose, dvh.mean_dose)
+
+    def test_invalid_dtype(self):
+        with self.assertRaises(ValueError):
+            DVH(self.test_doses, self.test_cum_vols, dtype=np.int32)
+
+    def test_quantize_doses(self):
+        for data in self.test_structs.values():
+            dvh = DVH(data["doses"], data["volumes"])
+            quantized = dvh.quantize_doses()
+            np.testing.assert_array_equal(quantized.doses, dvh.doses)
+            self.assertLess(quantized.nbytes, dvh.nbytes)
+            self.assertEqual(quantized.dose_to_volume_fraction(0.5), dvh.dose_to_volume_fraction(0.5))
+
+    def test_quantize_doses_invalid(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        with self.assertRaises(ValueError):
+            dvh.quantize_doses(3)
+
+    def test_simplify(self):
+        for data in self.test_structs.values():
+            dvh = DVH(data["doses"], data["volumes"])
+            simple = dvh.simplify(5, 0.002)
+            self.assertLess(len(simple.doses), len(dvh.doses))
+            self.assertEqual(simple.mean_dose, dvh.mean_dose)
+            self.assertEqual(simple.min_dose, dvh.min_dose)
+            self.assertEqual(simple.max_dose, dvh.max_dose)
+
+            doses = np.linspace(0, dvh.doses[-1], 5000)
+            fractions = np.linspace(0, 1, 5000)
+            v_err = np.abs(simple.volume_fraction_receiving_dose(doses) - dvh.volume_fraction_receiving_dose(doses))
+            d_err = np.abs(simple.dose_to_volume_fraction(fractions) - dvh.dose_to_volume_fraction(fractions))
+            self.assertLessEqual(v_err.max(), 0.002 + 1e-9)
+            self.assertLessEqual(d_err.max(), 5 + 1e-9)
+
+            # the simplified curve itself keeps the mean, not just its stats
+            recalculated = (simple.doses*simple.diff_volumes).sum()
+            self.assertLessEqual(abs(recalculated - dvh.mean_dose), 5)
+            self.assertLessEqual(abs(DVHCollection.from_dvhs([simple]).mean_dose[0] - dvh.mean_dose), 5)
+
+    def test_simplify_collinear(self):
+        dvh = DVH([0, 10, 20, 30, 40, 50, 60], [1, 1, 1, 0.75, 0.5, 0.25, 0])
+        simple = dvh.simplify(10, 0)
+        np.testing.assert_array_equal(simple.doses, [0, 10, 20, 50, 60])
+        np.testing.assert_array_equal(simple.cum_volumes, [1, 1, 1, 0.25, 0])
+
+        # dropping the collinear points moves the recalculated mean by 7.5
+        np.testing.assert_array_equal(dvh.simplify(0, 0).doses, dvh.doses)
+
+    def test_from_buffers(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        dvh2 = DVH.from_buffers(dvh.doses, dvh.cum_volumes, validate=True)
+        self.assertIs(dvh2.doses, dvh.doses)
+        self.assertIs(dvh2.cum_volumes, dvh.cum_volumes)
+        self.assertEqual(dvh.mean_dose, dvh2.mean_dose)
+        self.assertEqual(dvh.dose_to_volume_fraction(0.5), dvh2.dose_to_volume_fraction(0.5))
+
+    def test_from_buffers_validate(self):
+        with self.assertRaises(ValueError):
+            DVH.from_buffers(self.test_doses, self.test_cum_vols, validate=True)
+        with self.assertRaises(ValueError):
+            DVH.from_buffers([0., 1., 2.], [1., 0.5], validate=True)
+
+    def test_padding(self):
+        dvh = DVH([10, 20, 30], [3, 2, 1])
+        np.testing.assert_array_equal(dvh.doses, [0, 10, 20, 30, 40])
+        np.testing.assert_array_equal(dvh.cum_volumes, [1, 1, 2/3., 1/3., 0])
+
+    def test_bin_width_detection(self):
+        self.assertEqual(DVH(self.test_doses, self.test_cum_vols).bin_width, 10)
+        self.assertEqual(DVH.from_histogram([1, 2, 3], 0.5).bin_width, 0.5)
+        data = self.test_structs["Ant Scalene"]
+        self.assertIsNone(DVH(data["doses"], data["volumes"]).bin_width)
+
+    def test_uniform_queries_match_general(self):
+        rng = np.random.RandomState(11)
+        dvh = DVH.from_histogram(rng.rand(200), 0.3)
+        doses = rng.rand(500)*70 - 5
+        fractions = rng.rand(500)
+
+        volumes = dvh.volume_fraction_receiving_dose(doses)
+        dose_values = dvh.dose_to_volume_fraction(fractions)
+        for dose, expected in zip(doses, volumes):
+            self.assertEqual(dvh.volume_fraction_receiving_dose(float(dose)), expected)
+        for fraction, expected in zip(fractions, dose_values):
+            self.assertEqual(dvh.dose_to_volume_fraction(float(fraction)), expected)
+
+    def test_uniform_queries_tail_heavy(self):
+        # thousands of points share the lowest levels of the volume lookup
+        histogram = np.concatenate([np.ones(100), np.full(19900, 1E-9)])
+        dvh = DVH.from_histogram(histogram, 0.1)
+        fractions = [1E-6, 1E-7, 1E-9, 1E-10, 0.5]
+        expected = dvh.dose_to_volume_fraction(np.array(fractions))
+        self.assertEqual([dvh._uniform_dose_to_volume_fraction(f) for f in fractions], expected.tolist())
+
+    def test_declared_bin_width(self):
+        dvh = DVH(self.test_doses, self.test_cum_vols)
+        expected = dvh.volume_fraction_receiving_dose(np.array([55., 123., 333.]))
+        dvh.bin_width = 3.
+        self.assertEqual([dvh.volume_fraction_receiving_dose(d) for d in (55., 123., 333.)], expected.tolist())
+        with self.assertRaises(ValueError):
+            dvh.bin_width = 0
+
+    def test_wrong_bin_width(self):
+        # a declared spacing far from the real one only costs a binary search
+        dvh = DVH.from_histogram(np.ones(5000), 0.1)
+        doses = [0.05, 3.3, 250.01, 499.95, 499.99]
+        expected = dvh.volume_fraction_receiving_dose(np.array(doses))
+        for bin_width in (100., 0.0001):
+            dvh.bin_width = bin_width
+            self.assertEqual([dvh._uniform_volume_fraction_receiving_dose(d) for d in doses], expected.tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
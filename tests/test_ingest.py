@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_ingest
+----------------------------------
+
+Tests for `dvh.ingest` module.
+"""
+
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh import ingest
+from dvh import parsers
+
+
+EXPORT = """Ant Scalene\t0\t8.155
+Ant Scalene\t100\t8.155
+Ant Scalene\t200\t4.0
+Ant Scalene\t300\t0
+PTV {0}\t0\t503.55
+PTV {0}\t100\t503.55
+PTV {0}\t200\t251.7
+PTV {0}\t300\t0
+"""
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.drop = os.path.join(self.directory, "drop")
+        self.store = os.path.join(self.directory, "store")
+        os.makedirs(os.path.join(self.directory, "objects", "bucket", "plans"))
+        os.mkdir(self.drop)
+
+        for i in range(10):
+            with open(os.path.join(self.drop, "plan%d.txt" % i), "w") as f:
+                f.write(EXPORT.format(i))
+
+        for name in ("plans/a.txt", "plans/b.txt", "other.txt"):
+            with open(os.path.join(self.directory, "objects", "bucket", *name.split("/")), "w") as f:
+                f.write(EXPORT.format(name))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_directory_pipeline(self):
+        pipeline = ingest.ingest(ingest.DirectorySource(self.drop), ingest.DirectorySink(self.store), queue_size=2)
+
+        self.assertEqual(len(os.listdir(self.store)), 20)
+        self.assertEqual(pipeline.errors, [])
+
+        metrics = pipeline.metrics()
+        self.assertEqual(metrics["read"]["items"], 10)
+        self.assertEqual(metrics["serialize"]["items"], 20)
+        self.assertLessEqual(max(m["max_queue_depth"] for m in metrics.values()), 2)
+        self.assertEqual(metrics["write"]["queue_depth"], 0)
+
+        with open(os.path.join(self.store, "plan3__PTV_3.dvhb"), "rb") as f:
+            dvh = DVH.from_bytes(f.read())
+        expected = dict(parsers.iter_text(EXPORT.format(3)))["PTV 3"]
+        np.testing.assert_array_equal(dvh.cum_volumes, expected.cum_volumes)
+
+    def test_object_store_source(self):
+        source = ingest.ObjectStoreSource(os.path.join(self.directory, "objects"), "bucket", prefix="plans/")
+        self.assertEqual(sorted(source.keys()), ["plans/a.txt", "plans/b.txt"])
+
+        ingest.ingest(source, ingest.DirectorySink(self.store), method="json")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.store, "plans"))), [
+            "a__Ant_Scalene.json", "a__PTV_plans_a.txt.json", "b__Ant_Scalene.json", "b__PTV_plans_b.txt.json",
+        ])
+
+    def test_nested_keys(self):
+        for site in ("siteA", "siteB"):
+            os.makedirs(os.path.join(self.directory, "objects", "bucket", site))
+            with open(os.path.join(self.directory, "objects", "bucket", site, "plan.txt"), "w") as f:
+                f.write(EXPORT.format(site))
+
+        source = ingest.ObjectStoreSource(os.path.join(self.directory, "objects"), "bucket", prefix="site")
+        pipeline = ingest.ingest(source, ingest.DirectorySink(self.store))
+
+        self.assertEqual(pipeline.metrics()["write"]["items"], 4)
+        written = [os.path.join(d, n) for d, _, names in os.walk(self.store) for n in names]
+        self.assertEqual(len(written), 4)
+
+    def test_sink_refuses_overwrite(self):
+        sink = ingest.DirectorySink(self.store)
+        sink.write("plan.txt", "PTV 1", b"1")
+        with self.assertRaises(ValueError):
+            sink.write("plan.txt", "PTV/1", b"2")
+        with self.assertRaises(ValueError):
+            ingest.DirectorySink(self.store).write("plan.txt", "PTV 1", b"3")
+        with open(os.path.join(self.store, "plan__PTV_1.dvhb"), "rb") as f:
+            self.assertEqual(f.read(), b"1")
+
+    def test_errors(self):
+        with open(os.path.join(self.drop, "bad.txt"), "w") as f:
+            f.write("Cord\t10\t1\nCord\t5\t0\n")
+
+        pipeline = ingest.ingest(ingest.DirectorySource(self.drop), ingest.DirectorySink(self.store))
+        self.assertEqual(len(os.listdir(self.store)), 20)
+        self.assertEqual([(stage, os.path.basename(key)) for stage, key, _ in pipeline.errors], [("construct", "bad.txt")])
+        self.assertEqual(pipeline.metrics()["construct"]["items"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_instrumentation
+----------------------------------
+
+Tests for `dvh.instrumentation` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+import dvh
+from dvh import DVH
+from dvh import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        dvh.reset()
+        self.doses = np.arange(0, 370, 10)
+        self.volumes = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 4, 2, 1, 0, 0, 0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 60, 50, 40, 30, 20, 10, 0, 0]
+
+    def tearDown(self):
+        dvh.disable_instrumentation()
+        dvh.reset()
+        del instrumentation._sinks[:]
+
+    def test_disabled_by_default(self):
+        self.assertFalse(instrumentation.is_enabled())
+        DVH(self.doses, self.volumes).dose_to_volume_fraction(0.5)
+        self.assertEqual(dvh.stats(), {})
+
+    def test_disabled_methods_undecorated(self):
+        self.assertNotIn("__wrapped__", vars(DVH.dose_to_volume_fraction))
+        dvh.enable_instrumentation()
+        self.assertIn("__wrapped__", vars(DVH.dose_to_volume_fraction))
+        dvh.disable_instrumentation()
+        self.assertNotIn("__wrapped__", vars(DVH.dose_to_volume_fraction))
+
+    def test_function(self):
+        square = instrumentation.instrumented("square")(lambda x: x*x)
+        self.assertEqual(square(3), 9)
+        dvh.enable_instrumentation()
+        self.assertEqual(square(4), 16)
+        self.assertEqual(dvh.stats()["square"]["calls"], 1)
+
+    def test_stats(self):
+        dvh.enable_instrumentation()
+        d = DVH(self.doses, self.volumes)
+        d.dose_to_volume_fraction(0.5)
+        d.dose_to_volume_fraction(0.95)
+        d.serialize()
+
+        stats = dvh.stats()
+        self.assertEqual(stats["DVH.__init__"]["calls"], 1)
+        self.assertEqual(stats["DVH.__init__"]["sizes"], {64: 1})
+        self.assertEqual(stats["DVH._set_volumes"]["calls"], 1)
+        self.assertEqual(stats["DVH.dose_to_volume_fraction"]["calls"], 2)
+        self.assertEqual(stats["DVH.serialize"]["calls"], 1)
+        self.assertGreaterEqual(stats["DVH.serialize"]["total_time"], 0)
+
+    def test_reset(self):
+        dvh.enable_instrumentation()
+        DVH(self.doses, self.volumes)
+        dvh.reset()
+        self.assertEqual(dvh.stats(), {})
+
+    def test_failed_calls_recorded(self):
+        dvh.enable_instrumentation()
+        with self.assertRaises(ValueError):
+            DVH(volumes=self.volumes)
+        self.assertEqual(dvh.stats()["DVH.__init__"]["sizes"], {0: 1})
+
+    def test_sink(self):
+        calls = []
+        dvh.enable_instrumentation(lambda *args: calls.append(args))
+        DVH(self.doses, self.volumes).volume_fraction_receiving_dose(100)
+        operations = [c[0] for c in calls]
+        self.assertEqual(operations, ["DVH._set_volumes", "DVH.__init__", "DVH._calculate_stats", "DVH.volume_fraction_receiving_dose"])
+
+    def test_size_bucket(self):
+        self.assertEqual(instrumentation.size_bucket(0), 0)
+        self.assertEqual(instrumentation.size_bucket(1), 1)
+        self.assertEqual(instrumentation.size_bucket(37), 64)
+        self.assertEqual(instrumentation.size_bucket(64), 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parallel
+----------------------------------
+
+Tests for `dvh.parallel` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh.parallel import dvhs_from_dose_grid
+
+
+class TestDvhsFromDoseGrid(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(42)
+        self.dose = (rng.rand(12, 10, 10)*60).astype(np.float32)
+        self.labels = np.zeros(self.dose.shape, dtype=np.int16)
+        self.labels[2:6] = 1
+        self.labels[6:11, 3:8] = 2
+        self.labels[0, 0, :5] = 3
+        self.names = {"PTV": 1, "Cord": 2, "Lens": 3}
+        self.masks = dict((name, self.labels == label) for name, label in self.names.items())
+
+        self.expected = dict(
+            (name, DVH.from_dose_grid(self.dose, mask, 0.027, 0.25, slab_size=5))
+            for name, mask in self.masks.items()
+        )
+
+    def assertDVHsIdentical(self, dvhs):
+        self.assertEqual(sorted(dvhs), sorted(self.expected))
+        for name, dvh in dvhs.items():
+            expected = self.expected[name]
+            self.assertEqual(dvh.doses.tobytes(), expected.doses.tobytes())
+            self.assertEqual(dvh.cum_volumes.tobytes(), expected.cum_volumes.tobytes())
+            self.assertEqual(dvh.mean_dose, expected.mean_dose)
+
+    def test_labels_processes(self):
+        dvhs = dvhs_from_dose_grid(self.dose, self.names, 0.027, 0.25, labels=self.labels, max_workers=2, slab_size=5)
+        self.assertDVHsIdentical(dvhs)
+
+    def test_masks_processes(self):
+        dvhs = dvhs_from_dose_grid(self.dose, self.masks, 0.027, 0.25, max_workers=2, slab_size=5)
+        self.assertDVHsIdentical(dvhs)
+
+    def test_masks_threads(self):
+        dvhs = dvhs_from_dose_grid(self.dose, self.masks, 0.027, 0.25, use_threads=True, slab_size=5)
+        self.assertDVHsIdentical(dvhs)
+
+    def test_packed_masks(self):
+        # overlapping masks with a row length that is not a multiple of 8
+        dose = self.dose[:, :, :7]
+        masks = {"PTV": self.masks["PTV"][:, :, :7], "Body": np.ones(dose.shape, dtype=bool)}
+        dvhs = dvhs_from_dose_grid(dose, masks, 0.027, 0.25, max_workers=2, slab_size=5)
+        for name, mask in masks.items():
+            expected = DVH.from_dose_grid(dose, mask, 0.027, 0.25)
+            self.assertEqual(dvhs[name].cum_volumes.tobytes(), expected.cum_volumes.tobytes())
+
+    def test_mask_shape_mismatch(self):
+        with self.assertRaises(ValueError):
+            dvhs_from_dose_grid(self.dose, {"PTV": self.masks["PTV"][1:]}, 0.027, 0.25, max_workers=2)
+
+    def test_labels_threads(self):
+        dvhs = dvhs_from_dose_grid(self.dose, self.names, 0.027, 0.25, labels=self.labels, use_threads=True, slab_size=5)
+        self.assertDVHsIdentical(dvhs)
+
+    def test_order_preserved(self):
+        names = ["Lens", "PTV", "Cord"]
+        structures = dict((n, self.names[n]) for n in names)
+        dvhs = dvhs_from_dose_grid(self.dose, structures, 0.027, 0.25, labels=self.labels, use_threads=True)
+        self.assertEqual(list(dvhs), list(structures))
+
+
+if __name__ == '__main__':
+    unittest.main()
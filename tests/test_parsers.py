@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parsers
+----------------------------------
+
+Tests for `dvh.parsers` module.
+"""
+
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH
+from dvh import parsers
+
+
+MONACO = """Patient ID: 1234|Plan: Prostate
+Dose Units: cGy  Volume Units: cm3
+
+Ant Scalene\t0\t8.155
+Ant Scalene\t100\t8.155
+Ant Scalene\t200\t4.0
+Ant Scalene\t300\t0
+PTV 1\t0\t503.55
+PTV 1\t100\t503.55
+PTV 1\t200\t503.55
+PTV 1\t300\t251.7
+PTV 1\t400\t0
+Empty\t0\t0
+Empty\t100\t0
+"""
+
+ECLIPSE = """Patient Name         : Anonymous
+Plan: Prostate
+
+Structure: PTV
+Approval Status: Approved
+Volume [cm³]: 503.55
+
+Dose [%]      Dose [cGy]    Ratio of Total Structure Volume [%]
+       0             0                          100
+      25           100                          100
+      50           200                           50
+      75           300                            0
+
+Structure: Rectum
+Volume [cm³]: 60.1
+
+Dose [cGy]    Relative dose [%]    Ratio of Total Structure Volume [%]
+         0                    0                                  100
+       100                   25                                   40
+       200                   50                                    0
+"""
+
+
+class TestParsers(unittest.TestCase):
+
+    def test_detect_format(self):
+        self.assertEqual(parsers.detect_format(MONACO), "monaco")
+        self.assertEqual(parsers.detect_format(ECLIPSE), "eclipse")
+
+    def test_monaco(self):
+        dvhs = list(parsers.iter_text(MONACO))
+        self.assertEqual([name for name, _ in dvhs], ["Ant Scalene", "PTV 1"])
+
+        expected = DVH([0, 100, 200, 300], [8.155, 8.155, 4.0, 0])
+        np.testing.assert_array_equal(dvhs[0][1].doses, expected.doses)
+        np.testing.assert_allclose(dvhs[0][1].cum_volumes, expected.cum_volumes)
+
+    def test_monaco_records(self):
+        records = list(parsers.iter_records(MONACO, "monaco"))
+        self.assertEqual(len(records), 3)
+        name, doses, volumes = records[1]
+        self.assertEqual(name, "PTV 1")
+        np.testing.assert_array_equal(doses, [0, 100, 200, 300, 400])
+        np.testing.assert_array_equal(volumes, [503.55, 503.55, 503.55, 251.7, 0])
+
+    def test_eclipse(self):
+        dvhs = list(parsers.iter_text(ECLIPSE))
+        self.assertEqual([name for name, _ in dvhs], ["PTV", "Rectum"])
+
+        ptv = dvhs[0][1]
+        self.assertEqual(ptv.dose_to_volume_fraction(0.5), 200)
+        np.testing.assert_array_equal(dvhs[1][1].doses[:3], [0, 100, 200])
+
+    def test_bad_format(self):
+        with self.assertRaises(ValueError):
+            list(parsers.iter_records(MONACO, "pinnacle"))
+
+    def test_iter_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, text in (("a.txt", MONACO), ("b.txt", ECLIPSE)):
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(text)
+
+            found = [(os.path.basename(path), name) for path, name, _ in parsers.iter_directory(directory)]
+            self.assertEqual(found, [("a.txt", "Ant Scalene"), ("a.txt", "PTV 1"), ("b.txt", "PTV"), ("b.txt", "Rectum")])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_population
+----------------------------------
+
+Tests for `dvh.population` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH, DVHCollection
+from dvh import population
+
+
+class TestPopulation(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(7)
+        doses = np.arange(0, 370, 10)
+        self.dvhs = [DVH(doses, rng.randint(0, 20, len(doses))) for _ in range(25)]
+        self.dose_grid = np.linspace(0, 400, 81)
+        self.expected = np.array([
+            [d.volume_fraction_receiving_dose(x) for x in self.dose_grid] for d in self.dvhs
+        ])
+
+    def test_resample(self):
+        volumes = population.resample(self.dvhs, self.dose_grid)
+        self.assertEqual(volumes.shape, (len(self.dvhs), len(self.dose_grid)))
+        np.testing.assert_array_equal(volumes, self.expected)
+
+    def test_resample_collection(self):
+        collection = DVHCollection.from_dvhs(self.dvhs)
+        np.testing.assert_array_equal(population.resample(collection, self.dose_grid), self.expected)
+
+    def test_mean_std(self):
+        np.testing.assert_allclose(population.population_mean(self.dvhs, self.dose_grid), self.expected.mean(axis=0))
+        np.testing.assert_allclose(population.population_std(self.dvhs, self.dose_grid), self.expected.std(axis=0))
+
+    def test_percentiles(self):
+        bands = population.population_percentiles(self.dvhs, self.dose_grid, (10, 90))
+        np.testing.assert_allclose(bands, np.percentile(self.expected, (10, 90), axis=0))
+        np.testing.assert_allclose(population.population_median(self.dvhs, self.dose_grid), np.median(self.expected, axis=0))
+
+    def test_population_bands(self):
+        bands = population.population_bands(self.dvhs, self.dose_grid)
+        np.testing.assert_allclose(bands["mean"], self.expected.mean(axis=0))
+        np.testing.assert_allclose(bands["percentiles"][50], np.median(self.expected, axis=0))
+        self.assertTrue(np.all(bands["percentiles"][5] <= bands["percentiles"][95]))
+
+    def test_common_dose_grid(self):
+        grid = population.common_dose_grid(self.dvhs, 5)
+        self.assertEqual(grid[0], 0)
+        self.assertGreaterEqual(grid[-1], max(d.max_dose for d in self.dvhs))
+
+
+if __name__ == '__main__':
+    unittest.main()
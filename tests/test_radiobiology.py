@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_radiobiology
+----------------------------------
+
+Tests for `dvh.radiobiology` module.
+"""
+
+import math
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH, DVHCollection
+from dvh import radiobiology
+
+
+class TestRadiobiology(unittest.TestCase):
+
+    def setUp(self):
+
+        doses = np.arange(0, 370, 10)
+        diff_vols = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 4, 2, 1, 0, 0, 0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 60, 50, 40, 30, 20, 10, 0, 0]
+        self.dvhs = [
+            DVH(doses, diff_vols),
+            DVH([0, 5, 15, 25, 35], [10, 10, 5, 2, 0]),
+            DVH([1, 2, 3, 4], [30, 30, 10, 5]),
+        ]
+        # all volume receives exactly 50
+        self.uniform = DVH([0, 50, 60], [1, 1, 0])
+
+    def manual_geud(self, dvh, a):
+        v, d = dvh.diff_volumes, dvh.doses
+        nz = v > 0
+        if a == 0:
+            return math.exp((v[nz]*np.log(d[nz])).sum())
+        return ((v[nz]*d[nz]**a).sum())**(1./a)
+
+    def test_geud_matches_manual(self):
+        a = np.array([-10, -1, 0, 0.5, 1, 4, 20])
+        values = radiobiology.geud(self.dvhs, a)
+        self.assertEqual(values.shape, (len(self.dvhs), len(a)))
+        for dvh, row in zip(self.dvhs, values):
+            np.testing.assert_allclose(row, [self.manual_geud(dvh, x) for x in a])
+
+    def test_geud_mean_dose(self):
+        np.testing.assert_allclose(radiobiology.geud(self.dvhs, 1), [d.mean_dose for d in self.dvhs])
+
+    def test_geud_single_dvh(self):
+        self.assertAlmostEqual(radiobiology.geud(self.uniform, 7.5), 50)
+        self.assertEqual(radiobiology.geud(self.uniform, [[1, 2], [3, 4]]).shape, (2, 2))
+
+    def test_geud_blocked(self):
+        a = np.linspace(-5, 5, 41)
+        expected = radiobiology.geud(self.dvhs, a)
+        block = radiobiology.BLOCK_ELEMENTS
+        radiobiology.BLOCK_ELEMENTS = 10
+        try:
+            np.testing.assert_allclose(radiobiology.geud(DVHCollection.from_dvhs(self.dvhs), a), expected)
+        finally:
+            radiobiology.BLOCK_ELEMENTS = block
+
+    def test_lkb_ntcp(self):
+        self.assertAlmostEqual(radiobiology.lkb_ntcp(self.uniform, 50, 0.2, 0.5), 0.5)
+        ntcp = radiobiology.lkb_ntcp(self.dvhs, td50=[200, 300], m=0.18, n=[[0.1], [1]])
+        self.assertEqual(ntcp.shape, (3, 2, 2))
+
+        t = (self.manual_geud(self.dvhs[0], 10) - 200)/(0.18*200)
+        self.assertAlmostEqual(ntcp[0, 0, 0], 0.5*(1 + math.erf(t/math.sqrt(2))))
+        self.assertTrue(np.all((ntcp >= 0) & (ntcp <= 1)))
+
+    def test_poisson_tcp(self):
+        self.assertAlmostEqual(radiobiology.poisson_tcp(self.uniform, 50, 2), 0.5)
+        tcp = radiobiology.poisson_tcp(self.dvhs, [100, 200, 400], 2)
+        self.assertEqual(tcp.shape, (3, 3))
+        # higher D50 means lower control probability
+        self.assertTrue(np.all(np.diff(tcp, axis=1) <= 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_summary
+----------------------------------
+
+Tests for `dvh.summary` module.
+"""
+
+import unittest2 as unittest
+import numpy as np
+from dvh import DVH, DVHSummary
+from dvh.population import resample
+
+
+class TestDVHSummary(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(11)
+        doses = np.arange(0, 370, 10)
+        self.dvhs = [DVH(doses, rng.randint(0, 20, len(doses))) for _ in range(60)]
+        self.dose_grid = np.linspace(0, 380, 39)
+        self.volumes = resample(self.dvhs, self.dose_grid)
+
+    def test_mean_std(self):
+        summary = DVHSummary.from_dvhs(self.dvhs, self.dose_grid)
+        self.assertEqual(summary.count, len(self.dvhs))
+        np.testing.assert_allclose(summary.mean(), self.volumes.mean(axis=0))
+        np.testing.assert_allclose(summary.std(), self.volumes.std(axis=0), atol=1e-7)
+
+    def test_percentile_error_bound(self):
+        resolution = 200
+        summary = DVHSummary.from_dvhs(self.dvhs, self.dose_grid, resolution)
+        ordered = np.sort(self.volumes, axis=0)
+        n = len(self.dvhs)
+        for q in (0, 5, 50, 95, 100):
+            rank = min(max(int(np.ceil(q/100.*n)), 1), n)
+            np.testing.assert_allclose(summary.percentile(q), ordered[rank - 1], atol=0.5/resolution + 1e-12)
+
+        self.assertEqual(summary.percentile([5, 95]).shape, (2, len(self.dose_grid)))
+
+    def test_merge_matches_single_pass(self):
+        single = DVHSummary.from_dvhs(self.dvhs, self.dose_grid)
+        parts = [DVHSummary.from_dvhs(self.dvhs[i:i + 17], self.dose_grid) for i in range(0, len(self.dvhs), 17)]
+
+        merged = parts[0]
+        for part in parts[1:]:
+            merged = merged + part
+
+        self.assertEqual(merged.count, single.count)
+        np.testing.assert_array_equal(merged.histograms, single.histograms)
+        np.testing.assert_allclose(merged.mean(), single.mean())
+        np.testing.assert_array_equal(merged.percentile([5, 50, 95]), single.percentile([5, 50, 95]))
+
+    def test_merge_incompatible(self):
+        with self.assertRaises(ValueError):
+            DVHSummary(self.dose_grid).merge(DVHSummary(self.dose_grid, resolution=10))
+        with self.assertRaises(ValueError):
+            DVHSummary(self.dose_grid).merge(DVHSummary(self.dose_grid[:-1]))
+
+    def test_bytes_round_trip(self):
+        summary = DVHSummary.from_dvhs(self.dvhs, self.dose_grid)
+        data = summary.to_bytes()
+        self.assertLess(len(data), summary.histograms.nbytes)
+
+        summary2 = DVHSummary.from_bytes(data)
+        self.assertEqual(summary2.count, summary.count)
+        np.testing.assert_array_equal(summary2.dose_grid, summary.dose_grid)
+        np.testing.assert_array_equal(summary2.sums, summary.sums)
+        np.testing.assert_array_equal(summary2.histograms, summary.histograms)
+
+        summary2.add(self.dvhs[:3])
+        self.assertEqual(summary2.count, summary.count + 3)
+
+    def test_from_bytes_invalid(self):
+        with self.assertRaises(ValueError):
+            DVHSummary.from_bytes(b"garbage data here!!!!!!!!")
+
+
+if __name__ == '__main__':
+    unittest.main()